@@ -6,13 +6,21 @@ import json
 import time
 import math
 import threading
+import copy
 import traceback
+import heapq
+import hashlib
+import zlib
+import struct
+import mmap
+import shutil
 try:
     import numpy as np
 except ImportError:
     np = None
 from datetime import datetime
-from collections import OrderedDict
+from collections import OrderedDict, Counter, namedtuple
+from abc import ABC, abstractmethod
 
 # ---------------------- 全局配置与初始化 ----------------------
 SCREEN_WIDTH = 800
@@ -22,12 +30,26 @@ FPS = 60
 CHUNK_SIZE = 16
 RENDER_DISTANCE = 3
 Y_MAX = 128
+SECTION_HEIGHT = 16  # 区块分段高度，Y_MAX须为其整数倍；整段同一方块时不占存储
 WORLD_SEED = random.randint(0, 2**32 - 1)
+WORLD_NOISE_BACKEND = "perlin"  # 当前世界的噪声后端，随存档保存
 
 # 性能优化配置
 MAX_UPDATES_PER_FRAME = 50
 USE_DOUBLE_BUFFER = True
 FRAME_SKIP = 2
+COLUMN_CACHE_SIZE = 4096  # 地形列缓存容量（列数）
+CHUNK_GEN_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # 后台区块生成线程数
+MAX_CHUNK_INSTALLS_PER_FRAME = 4  # 每帧最多装入的新区块数
+CHUNK_UNLOAD_MARGIN = 2  # 卸载半径比加载半径多出的区块数
+CHUNK_PREFETCH_DISTANCE = 2  # 沿移动方向额外预取的区块数
+CHUNK_MIN_RESIDENCY = 10.0  # 区块最短驻留时间（秒）
+CHUNK_WARM_BUDGET = 8 * 1024 * 1024  # 卸载后在内存中压缩保存的区块总字节上限，超出后写入磁盘
+REGION_SIZE = 32  # 每个区域文件包含REGION_SIZE×REGION_SIZE个区块
+REGION_COMPACT_RATIO = 0.5  # 加载存档时无用数据超过该比例的区域文件会被压缩
+GENERATED_CACHE_BUDGET = 64 * 1024 * 1024  # 已生成区块磁盘缓存的字节上限
+DECORATION_PLAN_CACHE_SIZE = 1024  # 缓存的区块装饰规划数量
+TERRAIN_GENERATOR_VERSION = 2  # 地形算法改变时递增，使磁盘上已生成的区块数据失效
 
 # 移动设备配置
 IS_MOBILE = False
@@ -46,6 +68,9 @@ SCREENSHOT_DIR = os.path.join(exe_dir, "pic")
 OGG_DIR = os.path.join(exe_dir, "ogg")
 LOG_DIR = os.path.join(exe_dir, "log")
 TOOL_DIR = os.path.join(exe_dir, "tools")
+PREGEN_DIR = os.path.join(exe_dir, "pregen")
+CHUNK_SWAP_DIR = os.path.join(exe_dir, "swap")
+GENERATED_CACHE_DIR = os.path.join(exe_dir, "chunk_cache")
 BG_PHOTO_PATH = "game_bg.PNG"
 
 # 颜色定义
@@ -103,7 +128,6 @@ CRAFT_RECIPES = {
 }
 
 # 全局变量
-LOADED_CHUNKS = OrderedDict()
 DROPS = []
 MONSTERS = []
 menu_bg = None
@@ -139,7 +163,10 @@ SETTINGS = {
     "render_distance": 3,
     "fps_limit": 60,
     "log_enabled": True,  # 新增：日志开关
+    "noise_backend": "perlin",  # 新世界使用的噪声后端（perlin/lattice）
+    "autosave_minutes": 0,      # 自动存档间隔（分钟），0为关闭
 }
+AUTOSAVE_CHOICES = (0, 1, 5, 10)
 
 # ---------------------- 日志系统 ----------------------
 class GameLogger:
@@ -269,16 +296,81 @@ class GameLogger:
 # 全局日志实例
 game_logger = None
 
+# ---------------------- 噪声后端 ----------------------
+class NoiseBackend(ABC):
+    """噪声后端接口 - TerrainGenerator只通过noise2d/octave_noise2d及其数组版取噪声
+    
+    子类实现noise2d和noise2d_array，多层噪声由基类按两者组合。
+    同一后端的标量接口与数组接口必须逐位一致，有无numpy生成的世界才会相同。
+    """
+    name = None
+    
+    @abstractmethod
+    def noise2d(self, x, y, frequency=1.0):
+        """单层噪声"""
+    
+    @abstractmethod
+    def noise2d_array(self, xs, ys, frequency=1.0):
+        """单层噪声（数组版）"""
+    
+    def octave_noise2d(self, x, y, octaves=4, persistence=0.5, frequency=1.0):
+        """多层噪声"""
+        value = 0
+        amplitude = 1.0
+        max_value = 0
+        
+        for i in range(octaves):
+            value += self.noise2d(x, y, frequency * (2 ** i)) * amplitude
+            max_value += amplitude
+            amplitude *= persistence
+        
+        return value / max_value
+
+    def _scalar_map(self, func, xs, ys):
+        """无numpy时逐点回退到标量路径（支持嵌套序列与标量广播）"""
+        x_seq = isinstance(xs, (list, tuple, range))
+        y_seq = isinstance(ys, (list, tuple, range))
+        if not x_seq and not y_seq:
+            return func(xs, ys)
+        if not x_seq:
+            xs = [xs] * len(ys)
+        if not y_seq:
+            ys = [ys] * len(xs)
+        return [self._scalar_map(func, x, y) for x, y in zip(xs, ys)]
+
+    def octave_noise2d_array(self, xs, ys, octaves=4, persistence=0.5, frequency=1.0):
+        """多层噪声（数组版）"""
+        if np is None:
+            return self._scalar_map(
+                lambda x, y: self.octave_noise2d(x, y, octaves, persistence, frequency), xs, ys)
+
+        x, y = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        value = np.zeros(x.shape, dtype=np.float64)
+        amplitude = 1.0
+        max_value = 0
+
+        for i in range(octaves):
+            value += self.noise2d_array(x, y, frequency * (2 ** i)) * amplitude
+            max_value += amplitude
+            amplitude *= persistence
+
+        return value / max_value
+
 # ---------------------- 柏林噪声核心函数 ----------------------
-class PerlinNoise:
-    """优化的柏林噪声生成器"""
+class PerlinNoise(NoiseBackend):
+    """优化的柏林噪声生成器（经典置换表梯度，向零取整）"""
+    name = "perlin"
+    
     def __init__(self, seed=WORLD_SEED):
         self.seed = seed
-        random.seed(seed)
+        # 使用私有随机数生成器，不影响全局random的状态
+        self.rng = random.Random(seed)
         self.permutation = list(range(256))
-        random.shuffle(self.permutation)
+        self.rng.shuffle(self.permutation)
         self.p = self.permutation * 2
-    
+        # 批量接口使用的排列表（numpy不可用时为None）
+        self.p_array = np.array(self.p, dtype=np.int64) if np is not None else None
+
     def fade(self, t):
         """6t^5 - 15t^4 + 10t^3"""
         return t * t * t * (t * (t * 6 - 15) + 10)
@@ -319,34 +411,280 @@ class PerlinNoise:
         
         return self.lerp(v, x1, x2)
     
+    # ---------- 批量接口：整组坐标一次求值，结果与标量路径逐位一致 ----------
+    def grad_array(self, hash_val, x, y):
+        """梯度函数（数组版，z恒为0）"""
+        h = hash_val & 15
+        u = np.where(h < 8, x, y)
+        # 标量路径中z分量是整数0，取反后仍为+0，这里同样不对其取反
+        use_z = (h >= 4) & (h != 12) & (h != 14)
+        v = np.where(h < 4, y, np.where(use_z, 0.0, x))
+        u = np.where((h & 1) == 0, u, -u)
+        v = np.where(((h & 2) == 0) | use_z, v, -v)
+        return u + v
+
+    def noise2d_array(self, xs, ys, frequency=1.0):
+        """2D柏林噪声（数组版，xs/ys可广播）"""
+        if np is None:
+            return self._scalar_map(lambda x, y: self.noise2d(x, y, frequency), xs, ys)
+
+        x = np.asarray(xs, dtype=np.float64) * frequency
+        y = np.asarray(ys, dtype=np.float64) * frequency
+        x, y = np.broadcast_arrays(x, y)
+
+        # 向零取整，与int()一致；小数部分用整数回转的浮点数相减以保持-0.0的行为
+        x_int = x.astype(np.int64)
+        y_int = y.astype(np.int64)
+        xi = x_int & 255
+        yi = y_int & 255
+        xf = x - x_int.astype(np.float64)
+        yf = y - y_int.astype(np.float64)
+
+        u = self.fade(xf)
+        v = self.fade(yf)
+
+        p = self.p_array
+        a = p[xi] + yi
+        aa = p[a]
+        ab = p[a + 1]
+        b = p[xi + 1] + yi
+        ba = p[b]
+        bb = p[b + 1]
+
+        x1 = self.lerp(u, self.grad_array(aa, xf, yf), self.grad_array(ba, xf - 1, yf))
+        x2 = self.lerp(u, self.grad_array(ab, xf, yf - 1), self.grad_array(bb, xf - 1, yf - 1))
+
+        return self.lerp(v, x1, x2)
+
+class LatticeHashNoise(NoiseBackend):
+    """格点哈希梯度噪声 - 向下取整的格点经置换表哈希后直接查预计算的梯度表，无分支
+    
+    梯度集合与经典柏林噪声（z=0时）相同，数值范围一致，但生成的世界不同。
+    """
+    name = "lattice"
+    GRADIENTS = ((1.0, 1.0), (-1.0, 1.0), (1.0, -1.0), (-1.0, -1.0), (1.0, 0.0), (-1.0, 0.0), (0.0, 1.0), (0.0, -1.0))
+    
+    def __init__(self, seed=WORLD_SEED):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.permutation = list(range(256))
+        self.rng.shuffle(self.permutation)
+        self.p = self.permutation * 2
+        # 按排列表位置预先查好梯度：角点(X, Y)的梯度为gx[p[X] + Y]、gy[p[X] + Y]
+        self.gx = [self.GRADIENTS[h & 7][0] for h in self.p]
+        self.gy = [self.GRADIENTS[h & 7][1] for h in self.p]
+        if np is not None:
+            self.p_array = np.array(self.p, dtype=np.int64)
+            self.gx_array = np.array(self.gx, dtype=np.float64)
+            self.gy_array = np.array(self.gy, dtype=np.float64)
+    
+    def noise2d(self, x, y, frequency=1.0):
+        """2D格点哈希噪声"""
+        x *= frequency
+        y *= frequency
+        x0 = math.floor(x)
+        y0 = math.floor(y)
+        xf = x - x0
+        yf = y - y0
+        
+        p = self.p
+        gx = self.gx
+        gy = self.gy
+        yi = y0 & 255
+        a = p[x0 & 255] + yi
+        b = p[(x0 & 255) + 1] + yi
+        
+        u = xf * xf * xf * (xf * (xf * 6 - 15) + 10)
+        v = yf * yf * yf * (yf * (yf * 6 - 15) + 10)
+        n00 = gx[a] * xf + gy[a] * yf
+        n10 = gx[b] * (xf - 1) + gy[b] * yf
+        n01 = gx[a + 1] * xf + gy[a + 1] * (yf - 1)
+        n11 = gx[b + 1] * (xf - 1) + gy[b + 1] * (yf - 1)
+        x1 = n00 + u * (n10 - n00)
+        x2 = n01 + u * (n11 - n01)
+        return x1 + v * (x2 - x1)
+    
     def octave_noise2d(self, x, y, octaves=4, persistence=0.5, frequency=1.0):
-        """多层柏林噪声"""
+        """多层格点哈希噪声（内联单层计算，省去每层的方法调用）"""
+        p = self.p
+        gx = self.gx
+        gy = self.gy
         value = 0
         amplitude = 1.0
         max_value = 0
         
         for i in range(octaves):
-            value += self.noise2d(x, y, frequency * (2 ** i)) * amplitude
+            scale = frequency * (2 ** i)
+            sx = x * scale
+            sy = y * scale
+            x0 = math.floor(sx)
+            y0 = math.floor(sy)
+            xf = sx - x0
+            yf = sy - y0
+            yi = y0 & 255
+            a = p[x0 & 255] + yi
+            b = p[(x0 & 255) + 1] + yi
+            u = xf * xf * xf * (xf * (xf * 6 - 15) + 10)
+            v = yf * yf * yf * (yf * (yf * 6 - 15) + 10)
+            n00 = gx[a] * xf + gy[a] * yf
+            n10 = gx[b] * (xf - 1) + gy[b] * yf
+            n01 = gx[a + 1] * xf + gy[a + 1] * (yf - 1)
+            n11 = gx[b + 1] * (xf - 1) + gy[b + 1] * (yf - 1)
+            x1 = n00 + u * (n10 - n00)
+            x2 = n01 + u * (n11 - n01)
+            value += (x1 + v * (x2 - x1)) * amplitude
             max_value += amplitude
             amplitude *= persistence
         
         return value / max_value
+    
+    def noise2d_array(self, xs, ys, frequency=1.0):
+        """2D格点哈希噪声（数组版，xs/ys可广播）"""
+        if np is None:
+            return self._scalar_map(lambda x, y: self.noise2d(x, y, frequency), xs, ys)
+        
+        x = np.asarray(xs, dtype=np.float64) * frequency
+        y = np.asarray(ys, dtype=np.float64) * frequency
+        x, y = np.broadcast_arrays(x, y)
+        x0 = np.floor(x)
+        y0 = np.floor(y)
+        xf = x - x0
+        yf = y - y0
+        
+        p = self.p_array
+        gx = self.gx_array
+        gy = self.gy_array
+        xi = x0.astype(np.int64) & 255
+        yi = y0.astype(np.int64) & 255
+        a = p[xi] + yi
+        b = p[xi + 1] + yi
+        
+        u = xf * xf * xf * (xf * (xf * 6 - 15) + 10)
+        v = yf * yf * yf * (yf * (yf * 6 - 15) + 10)
+        n00 = gx[a] * xf + gy[a] * yf
+        n10 = gx[b] * (xf - 1) + gy[b] * yf
+        n01 = gx[a + 1] * xf + gy[a + 1] * (yf - 1)
+        n11 = gx[b + 1] * (xf - 1) + gy[b + 1] * (yf - 1)
+        x1 = n00 + u * (n10 - n00)
+        x2 = n01 + u * (n11 - n01)
+        return x1 + v * (x2 - x1)
+
+# 可选的噪声后端；每个世界在存档中记录生成它的后端
+NOISE_BACKENDS = {backend.name: backend for backend in (PerlinNoise, LatticeHashNoise)}
+
+def set_world_noise_backend(name):
+    """切换当前世界使用的噪声后端（也用作命令行工具进程池的初始化函数）"""
+    global WORLD_NOISE_BACKEND
+    if name not in NOISE_BACKENDS:
+        raise ValueError(f"未知的噪声后端：{name}")
+    WORLD_NOISE_BACKEND = name
 
 # ---------------------- 泰拉瑞亚地形生成器 ----------------------
+class LRUCache:
+    """线程安全的LRU缓存 - 超出max_size时淘汰最久未使用的项，并统计命中率"""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """读取缓存项，未命中返回None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        """写入缓存项并淘汰最久未使用的项"""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+# 全局列缓存：(生成器缓存键, world_x) -> (地表高度, 生物群系)，跨区块、跨生成器共享
+COLUMN_CACHE = LRUCache(COLUMN_CACHE_SIZE)
+# 装饰规划缓存：(生成器缓存键, 区块x, 区块y) -> 锚点在该区块内的结构列表
+DECORATION_PLAN_CACHE = LRUCache(DECORATION_PLAN_CACHE_SIZE)
+
+# 装饰结构可以覆盖的方块
+DECORATION_AIR = frozenset((0,))
+DECORATION_STONE = frozenset((3, 11))
+
+class StructureTemplate:
+    """预编译的装饰结构 - 相对锚点的(dx, dy, 方块ID, 可覆盖的方块)列表及包围盒"""
+    
+    def __init__(self, name, cells):
+        self.name = name
+        self.cells = tuple(cells)
+        self.min_dx = min(cell[0] for cell in self.cells)
+        self.max_dx = max(cell[0] for cell in self.cells)
+        self.min_dy = min(cell[1] for cell in self.cells)
+        self.max_dy = max(cell[1] for cell in self.cells)
+
+def build_tree_template(trunk_height, leaves_radius=2):
+    """树木模板：锚点为地表方块，树干向上，树叶只长在空气中"""
+    cells = [(0, dy, 5, DECORATION_AIR) for dy in range(1, trunk_height + 1)]
+    for dx in range(-leaves_radius, leaves_radius + 1):
+        for dy in range(-leaves_radius, 1):
+            if math.hypot(dx, dy) <= leaves_radius:
+                cells.append((dx, trunk_height + dy, 6, DECORATION_AIR))
+    return StructureTemplate(f"tree_{trunk_height}", cells)
+
+TREE_TEMPLATES = tuple(build_tree_template(trunk_height) for trunk_height in range(4, 8))
+BOULDER_TEMPLATES = (
+    StructureTemplate("boulder_small", [(0, 1, 3, DECORATION_AIR), (1, 1, 3, DECORATION_AIR)]),
+    StructureTemplate("boulder_large", [(-1, 1, 3, DECORATION_AIR), (0, 1, 3, DECORATION_AIR),
+                                        (1, 1, 3, DECORATION_AIR), (0, 2, 3, DECORATION_AIR)]),
+)
+ORE_VEIN_SHAPES = (
+    ((0, 0), (1, 0), (0, 1)),
+    ((0, 0), (1, 0), (1, 1), (2, 1)),
+    ((0, 0), (-1, 0), (1, 0), (0, 1), (0, -1)),
+)
+ORE_VEIN_TEMPLATES = {
+    ore: tuple(StructureTemplate(f"vein_{ore}_{i}", [(dx, dy, ore, DECORATION_STONE) for dx, dy in shape])
+               for i, shape in enumerate(ORE_VEIN_SHAPES))
+    for ore in (7, 12, 13)
+}
+
 class TerrainGenerator:
-    """泰拉瑞亚风格地形生成器 - 多噪声混合"""
+    """泰拉瑞亚风格地形生成器 - 多噪声混合
     
-    def __init__(self, seed=WORLD_SEED):
+    构造完成后不再修改任何状态，可在多个区块、多个线程间共享；
+    请通过get_terrain_generator(seed)获取共享实例。
+    noise_backend 为NOISE_BACKENDS中的后端名，不同后端生成不同的世界。
+    """
+    
+    def __init__(self, seed=WORLD_SEED, noise_backend="perlin"):
         self.seed = seed
-        self.perlin = PerlinNoise(seed)
+        self.noise_backend = noise_backend
+        # 列缓存键：噪声后端不同的生成器不能共用列数据
+        self.cache_key = (seed, noise_backend)
+        noise_class = NOISE_BACKENDS[noise_backend]
+        self.perlin = noise_class(seed)
         
         # 地形参数
-        self.terrain_noise1 = PerlinNoise(seed * 2 + 1)
-        self.terrain_noise2 = PerlinNoise(seed * 3 + 2)
-        self.biome_noise = PerlinNoise(seed * 5 + 3)
-        self.cave_noise1 = PerlinNoise(seed * 7 + 4)
-        self.cave_noise2 = PerlinNoise(seed * 11 + 5)
-        self.ore_noise = PerlinNoise(seed * 13 + 6)
+        self.terrain_noise1 = noise_class(seed * 2 + 1)
+        self.terrain_noise2 = noise_class(seed * 3 + 2)
+        self.biome_noise = noise_class(seed * 5 + 3)
+        self.cave_noise1 = noise_class(seed * 7 + 4)
+        self.cave_noise2 = noise_class(seed * 11 + 5)
+        self.ore_noise = noise_class(seed * 13 + 6)
         
         # 地表参数
         self.base_height = Y_MAX // 2
@@ -364,6 +702,19 @@ class TerrainGenerator:
         
         # 矿石参数
         self.ore_frequency = 0.1
+        
+        # 装饰参数
+        self.tree_chance = {"desert": 0.0, "forest": 0.2, "plains": 0.05, "hills": 0.03}
+        self.boulder_chance = 0.02
+        self.ore_vein_attempts = 2
+    
+    def signature(self):
+        """地形参数签名（不含种子）：算法版本或任一参数变化时改变"""
+        params = (TERRAIN_GENERATOR_VERSION, self.noise_backend, CHUNK_SIZE, Y_MAX,
+                  self.base_height, self.amplitude, self.frequency, self.biome_size,
+                  self.cave_threshold, self.cave_frequency, self.ore_frequency,
+                  sorted(self.tree_chance.items()), self.boulder_chance, self.ore_vein_attempts)
+        return hashlib.sha1(repr(params).encode("utf-8")).hexdigest()[:16]
     
     def get_height(self, x):
         """获取地表高度 - 使用双噪声混合"""
@@ -390,7 +741,10 @@ class TerrainGenerator:
     def get_biome(self, x):
         """获取生物群系"""
         biome_value = self.biome_noise.noise2d(x / self.biome_size, 0, 1.0)
-        
+        return self.classify_biome(biome_value)
+    
+    def classify_biome(self, biome_value):
+        """根据生物群系噪声值划分群系"""
         if biome_value < -0.5:
             return "desert"  # 沙漠
         elif biome_value < 0:
@@ -400,8 +754,69 @@ class TerrainGenerator:
         else:
             return "hills"   # 丘陵
     
-    def is_cave(self, x, y):
-        """判断是否是洞穴 - 多层洞穴噪声"""
+    def get_column_profile(self, x):
+        """获取单列的(地表高度, 生物群系)，优先读取列缓存"""
+        return self.get_column_profiles(x, 1)[0]
+    
+    def get_column_profiles(self, start_x, count):
+        """获取连续count列的(地表高度, 生物群系)，未命中的列批量求值后写入缓存"""
+        profiles = [COLUMN_CACHE.get((self.cache_key, start_x + i)) for i in range(count)]
+        missing = [start_x + i for i, profile in enumerate(profiles) if profile is None]
+        if not missing:
+            return profiles
+        
+        for x, profile in zip(missing, self.compute_column_profiles(missing)):
+            COLUMN_CACHE.put((self.cache_key, x), profile)
+            profiles[x - start_x] = profile
+        return profiles
+    
+    def compute_column_profiles(self, xs):
+        """批量计算多列的(地表高度, 生物群系)；精确采样时与get_height/get_biome逐位一致"""
+        if np is None:
+            base_values = [self.terrain_noise1.octave_noise2d(x, 0, octaves=6, persistence=0.5, frequency=self.frequency) for x in xs]
+            detail_values = [self.terrain_noise2.octave_noise2d(x, 100, octaves=8, persistence=0.7, frequency=self.frequency * 2) for x in xs]
+        else:
+            x_arr = np.asarray(xs, dtype=np.float64)
+            base_values = self.terrain_noise1.octave_noise2d_array(x_arr, 0, octaves=6, persistence=0.5, frequency=self.frequency).tolist()
+            detail_values = self.terrain_noise2.octave_noise2d_array(x_arr, 100, octaves=8, persistence=0.7, frequency=self.frequency * 2).tolist()
+        
+        mountain_values = self.mountain_values(xs)
+        biome_values = self.biome_values(xs)
+        
+        profiles = []
+        for base_noise, detail_noise, mountain_noise, biome_value in zip(base_values, detail_values, mountain_values, biome_values):
+            height = self.base_height + (base_noise * 0.7 + detail_noise * 0.3) * self.amplitude
+            if mountain_noise > 0.8:
+                height += mountain_noise * 30
+            profiles.append((max(20, min(height, Y_MAX - 30)), self.classify_biome(biome_value)))
+        return profiles
+    
+    # ---------- 低频场：批量求值 ----------
+    def biome_values(self, xs):
+        """生物群系噪声值（批量，与get_biome逐位一致）"""
+        if np is None:
+            return [self.biome_noise.noise2d(x / self.biome_size, 0, 1.0) for x in xs]
+        return self.biome_noise.noise2d_array(np.asarray(xs, dtype=np.float64) / self.biome_size, 0, 1.0).tolist()
+    
+    def mountain_values(self, xs):
+        """山地噪声值（批量，与get_height逐位一致）"""
+        if np is None:
+            return [abs(self.perlin.noise2d(x * 0.005, 0, 0.5)) for x in xs]
+        return np.abs(self.perlin.noise2d_array(np.asarray(xs, dtype=np.float64) * 0.005, 0, 0.5)).tolist()
+    
+    def deep_cave_values(self, xs, ys):
+        """深层洞穴噪声值（批量，与is_cave逐位一致）"""
+        if np is None:
+            return [self.perlin.noise2d(x * 0.02, y * 0.02, 0.3) for x, y in zip(xs, ys)]
+        return self.perlin.noise2d_array(np.asarray(xs, dtype=np.float64) * 0.02,
+                                         np.asarray(ys, dtype=np.float64) * 0.02, 0.3).tolist()
+    
+    def deep_cave_factor(self, y):
+        """深层洞穴权重，y超过Y_MAX的70%后大于0"""
+        return max(0, (y - Y_MAX * 0.7) / (Y_MAX * 0.3))
+    
+    def is_cave(self, x, y, deep_cave=None):
+        """判断是否是洞穴 - 多层洞穴噪声（deep_cave为预先采样的深层洞穴噪声值）"""
         if y < 20:
             return False
         
@@ -415,9 +830,10 @@ class TerrainGenerator:
         cave_value = (cave1 + cave2 * 0.3) * (1.0 + y / Y_MAX * 2)
         
         # 深层洞穴
-        deep_factor = max(0, (y - Y_MAX * 0.7) / (Y_MAX * 0.3))
+        deep_factor = self.deep_cave_factor(y)
         if deep_factor > 0:
-            deep_cave = self.perlin.noise2d(x * 0.02, y * 0.02, 0.3)
+            if deep_cave is None:
+                deep_cave = self.perlin.noise2d(x * 0.02, y * 0.02, 0.3)
             cave_value = max(cave_value, deep_cave * deep_factor)
         
         return cave_value > self.cave_threshold
@@ -467,23 +883,52 @@ class TerrainGenerator:
         else:
             return 11
     
+    def classify_chunk(self, chunk_x, chunk_y, profiles=None):
+        """根据列高度范围预判区块是否均匀：全空气返回0，全深层石返回11，否则返回None"""
+        if profiles is None:
+            profiles = self.get_column_profiles(chunk_x * CHUNK_SIZE, CHUNK_SIZE)
+        heights = [height for height, _ in profiles]
+        min_y = chunk_y * CHUNK_SIZE
+        max_y = min_y + CHUNK_SIZE - 1
+        
+        # 整块在所有列地表之上：无论是否洞穴都是空气
+        if min_y > max(heights):
+            return 0
+        # 整块在洞穴/矿石起始深度之下，且低于所有列的石层：全是深层石
+        if max_y < 20 and max_y < min(heights) - 10:
+            return 11
+        return None
+    
     def generate_chunk(self, chunk_x, chunk_y):
         """生成区块地形"""
         chunk_data = []
         
+        # 地表高度和生物群系只与x有关，每列只取一次
+        profiles = self.get_column_profiles(chunk_x * CHUNK_SIZE, CHUNK_SIZE)
+        
+        # 均匀区块跳过洞穴和矿石噪声
+        uniform_block = self.classify_chunk(chunk_x, chunk_y, profiles)
+        if uniform_block is not None:
+            return [[uniform_block] * CHUNK_SIZE for _ in range(CHUNK_SIZE)]
+        
+        # 深层洞穴噪声对需要它的行整块批量求值，不在is_cave里逐点求值
+        deep_caves = {}
+        deep_points = [(chunk_x * CHUNK_SIZE + local_x, chunk_y * CHUNK_SIZE + local_y)
+                       for local_y in range(CHUNK_SIZE) if self.deep_cave_factor(chunk_y * CHUNK_SIZE + local_y) > 0
+                       for local_x in range(CHUNK_SIZE)]
+        if deep_points:
+            deep_caves = dict(zip(deep_points, self.deep_cave_values([p[0] for p in deep_points], [p[1] for p in deep_points])))
+        
         for local_y in range(CHUNK_SIZE):
             world_y = chunk_y * CHUNK_SIZE + local_y
             row = []
             
             for local_x in range(CHUNK_SIZE):
                 world_x = chunk_x * CHUNK_SIZE + local_x
-                
-                # 获取地表高度和生物群系
-                surface_height = self.get_height(world_x)
-                biome = self.get_biome(world_x)
+                surface_height, biome = profiles[local_x]
                 
                 # 判断是否是洞穴
-                if self.is_cave(world_x, world_y):
+                if self.is_cave(world_x, world_y, deep_caves.get((world_x, world_y))):
                     block_type = 0
                 else:
                     # 获取基础方块
@@ -501,6 +946,131 @@ class TerrainGenerator:
         
         return chunk_data
 
+    # ---------- 装饰阶段 ----------
+    def decoration_seed(self, chunk_x, chunk_y):
+        """区块装饰随机数种子：只取决于世界种子和区块坐标"""
+        return (self.seed * 341873128712 + chunk_x * 132897987541 + chunk_y * 42317861) & 0xFFFFFFFFFFFF
+    
+    def vein_ore(self, world_y, roll):
+        """按深度选择矿脉的矿石，与get_ore_at的深度分布一致"""
+        if world_y < 30:
+            return None
+        if world_y < 50:
+            return 7
+        if world_y < 80:
+            return 12
+        return 13 if roll < 0.5 else 12
+    
+    def plan_decorations(self, chunk_x, chunk_y):
+        """规划锚点位于该区块内的装饰结构，返回((锚点x, 锚点y, 模板), ...)
+        
+        只用列数据和单点洞穴判断，不生成任何区块的方块；结果缓存，供相邻区块复用。
+        """
+        key = (self.cache_key, chunk_x, chunk_y)
+        plan = DECORATION_PLAN_CACHE.get(key)
+        if plan is not None:
+            return plan
+        
+        rng = random.Random(self.decoration_seed(chunk_x, chunk_y))
+        min_x = chunk_x * CHUNK_SIZE
+        min_y = chunk_y * CHUNK_SIZE
+        profiles = self.get_column_profiles(min_x, CHUNK_SIZE)
+        plan = []
+        
+        # 地表结构：树木和石块，锚点为该列最高的实心方块
+        next_free_x = 0
+        for local_x, (height, biome) in enumerate(profiles):
+            # 每列固定抽取两次，某列是否放置不影响其它列
+            roll = rng.random()
+            template_roll = rng.random()
+            top = int(height)
+            if local_x < next_free_x or not min_y <= top < min_y + CHUNK_SIZE:
+                continue
+            if roll < self.tree_chance[biome]:
+                templates = TREE_TEMPLATES
+            elif roll >= 1 - self.boulder_chance:
+                templates = BOULDER_TEMPLATES
+            else:
+                continue
+            if self.is_cave(min_x + local_x, top):
+                continue
+            template = templates[int(template_roll * len(templates))]
+            plan.append((min_x + local_x, top, template))
+            next_free_x = local_x + template.max_dx - template.min_dx + 1
+        
+        # 矿脉：整块都是空气的区块不放
+        if self.classify_chunk(chunk_x, chunk_y, profiles) != 0:
+            for _ in range(self.ore_vein_attempts):
+                local_x = rng.randrange(CHUNK_SIZE)
+                local_y = rng.randrange(CHUNK_SIZE)
+                shape_roll = rng.random()
+                ore = self.vein_ore(min_y + local_y, rng.random())
+                if ore is None:
+                    continue
+                templates = ORE_VEIN_TEMPLATES[ore]
+                plan.append((min_x + local_x, min_y + local_y, templates[int(shape_roll * len(templates))]))
+        
+        plan = tuple(plan)
+        DECORATION_PLAN_CACHE.put(key, plan)
+        return plan
+    
+    def decorate_chunk(self, chunk_x, chunk_y, chunk_data):
+        """装饰阶段：把3×3邻域内规划的结构裁剪到本区块，一次性写入chunk_data，返回改变的格子数
+        
+        结构位置只取决于锚点所在区块，任何区块独立计算都得到相同结果，跨边界的部分不会被截断；
+        邻域内的结构按锚点区块坐标的固定顺序叠加。
+        """
+        min_x = chunk_x * CHUNK_SIZE
+        min_y = chunk_y * CHUNK_SIZE
+        writes = {}
+        for owner_x in (chunk_x - 1, chunk_x, chunk_x + 1):
+            for owner_y in (chunk_y - 1, chunk_y, chunk_y + 1):
+                for anchor_x, anchor_y, template in self.plan_decorations(owner_x, owner_y):
+                    if (anchor_x + template.max_dx < min_x or anchor_x + template.min_dx >= min_x + CHUNK_SIZE or
+                            anchor_y + template.max_dy < min_y or anchor_y + template.min_dy >= min_y + CHUNK_SIZE):
+                        continue
+                    for dx, dy, block_id, replaceable in template.cells:
+                        local_x = anchor_x + dx - min_x
+                        local_y = anchor_y + dy - min_y
+                        if 0 <= local_x < CHUNK_SIZE and 0 <= local_y < CHUNK_SIZE:
+                            cell = (local_x, local_y)
+                            if writes.get(cell, chunk_data[local_y][local_x]) in replaceable:
+                                writes[cell] = block_id
+        
+        changed = 0
+        for (local_x, local_y), block_id in writes.items():
+            if chunk_data[local_y][local_x] != block_id:
+                chunk_data[local_y][local_x] = block_id
+                changed += 1
+        return changed
+    
+    def generate_decorated_chunk(self, chunk_x, chunk_y):
+        """基础地形加装饰，返回(区块数据, 均匀方块ID)；装饰后不再均匀时均匀方块ID为None"""
+        chunk_data = self.generate_chunk(chunk_x, chunk_y)
+        uniform_block = self.classify_chunk(chunk_x, chunk_y)
+        if self.decorate_chunk(chunk_x, chunk_y, chunk_data):
+            uniform_block = None
+        return chunk_data, uniform_block
+
+# 地形生成器注册表：每个种子只构建一次
+TERRAIN_GENERATORS = {}
+TERRAIN_GENERATORS_LOCK = threading.Lock()
+
+def get_terrain_generator(seed, noise_backend=None):
+    """获取指定种子（及噪声后端）的共享地形生成器（线程安全），后端默认为当前世界的后端"""
+    if noise_backend is None:
+        noise_backend = WORLD_NOISE_BACKEND
+    key = (seed, noise_backend)
+    generator = TERRAIN_GENERATORS.get(key)
+    if generator is not None:
+        return generator
+    with TERRAIN_GENERATORS_LOCK:
+        generator = TERRAIN_GENERATORS.get(key)
+        if generator is None:
+            generator = TerrainGenerator(seed, noise_backend)
+            TERRAIN_GENERATORS[key] = generator
+        return generator
+
 # ---------------------- 性能优化函数 ----------------------
 def get_current_fps():
     """获取当前FPS"""
@@ -620,6 +1190,17 @@ def update_player_movement_from_joystick(player, delta_time):
     player.world_x += joystick_vector[0] * move_speed / BLOCK_SIZE
     player.world_z += joystick_vector[1] * move_speed / BLOCK_SIZE
 
+def get_player_movement_vector():
+    """获取玩家当前的移动方向（键盘与虚拟摇杆）"""
+    keys = pygame.key.get_pressed()
+    move_x = int(keys[pygame.K_d] or keys[pygame.K_RIGHT]) - int(keys[pygame.K_a] or keys[pygame.K_LEFT])
+    move_z = int(keys[pygame.K_s] or keys[pygame.K_DOWN]) - int(keys[pygame.K_w] or keys[pygame.K_UP])
+    
+    if joystick_active and VIRTUAL_JOYSTICK_ENABLED:
+        move_x += joystick_vector[0]
+        move_z += joystick_vector[1]
+    return move_x, move_z
+
 # ---------------------- 工具模块 ----------------------
 def init_sounds():
     global SOUNDS
@@ -686,13 +1267,76 @@ def play_random_ogg_music():
         if game_logger:
             game_logger.error(f"音乐加载失败：{str(e)}")
 
-def draw_infinite_map(screen, loaded_chunks, player):
-    """优化的地图绘制函数"""
+class ChunkRenderCache:
+    """区块俯视图缓存 - 每个区块画好一张带逐像素透明度的图（方块按距离透明度、边框不透明），绘制时整块贴图
+    
+    订阅世界的方块修改事件，只重画发生修改的那一列；区块对象被替换（重新载入）或透明度变化时整块重画。
+    按最近绘制的顺序只保留能同时出现在屏幕上的区块数量，其余丢弃。
+    """
+    
+    def __init__(self):
+        self.entries = OrderedDict()    # 区块坐标 -> [区块, 俯视图, 透明度]，最近绘制的在后
+    
+    def surface(self, key, chunk, alpha):
+        """返回区块的俯视图，缓存缺失、区块已被替换或透明度变化时重画"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not chunk:
+            size = CHUNK_SIZE * BLOCK_SIZE
+            entry = [chunk, pygame.Surface((size, size), pygame.SRCALPHA), alpha]
+            self.entries[key] = entry
+            self._draw_all(entry)
+        elif entry[2] != alpha:
+            entry[2] = alpha
+            self._draw_all(entry)
+        self.entries.move_to_end(key)
+        return entry[1]
+    
+    def _draw_all(self, entry):
+        entry[1].fill((0, 0, 0, 0))
+        for x in range(CHUNK_SIZE):
+            for z in range(CHUNK_SIZE):
+                self._draw_cell(entry, x, z)
+    
+    def _draw_cell(self, entry, x, z):
+        chunk, surface, alpha = entry
+        cell_rect = pygame.Rect(x * BLOCK_SIZE, z * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+        block_id = chunk.top_block(x, z)
+        if block_id != 0:
+            surface.fill((*BLOCK_TYPES[block_id]["color"], alpha), cell_rect)
+            pygame.draw.rect(surface, GRAY, cell_rect, 1)
+        else:
+            surface.fill((0, 0, 0, 0), cell_rect)
+    
+    def apply_changes(self, changes):
+        """方块修改事件的订阅回调"""
+        for chunk_key, x, y, z, old_block, new_block in changes:
+            entry = self.entries.get(chunk_key)
+            if entry is not None:
+                self._draw_cell(entry, x, z)
+    
+    def trim(self, limit):
+        """只保留最近绘制的limit个区块"""
+        while len(self.entries) > limit:
+            self.entries.popitem(last=False)
+
+def draw_infinite_map(screen, loaded_chunks, player, chunk_renderer, pending_chunks=()):
+    """优化的地图绘制函数：区块俯视图取自chunk_renderer缓存"""
     player_screen_x = SCREEN_WIDTH // 2
     player_screen_y = SCREEN_HEIGHT // 2
     
     visible_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
     
+    # 后台尚未生成完成的区块绘制占位框
+    for (chunk_x, chunk_z) in pending_chunks:
+        if (chunk_x, chunk_z) in loaded_chunks:
+            continue
+        chunk_screen_x = (chunk_x * CHUNK_SIZE - player.world_x) * BLOCK_SIZE + player_screen_x
+        chunk_screen_z = (chunk_z * CHUNK_SIZE - player.world_z) * BLOCK_SIZE + player_screen_y
+        placeholder_rect = pygame.Rect(chunk_screen_x, chunk_screen_z, CHUNK_SIZE*BLOCK_SIZE, CHUNK_SIZE*BLOCK_SIZE)
+        if visible_rect.colliderect(placeholder_rect):
+            pygame.draw.rect(screen, PROGRESS_BG, placeholder_rect)
+            pygame.draw.rect(screen, GRAY, placeholder_rect, 1)
+    
     for (chunk_x, chunk_z), chunk in loaded_chunks.items():
         chunk_screen_x = (chunk_x * CHUNK_SIZE - player.world_x) * BLOCK_SIZE + player_screen_x
         chunk_screen_z = (chunk_z * CHUNK_SIZE - player.world_z) * BLOCK_SIZE + player_screen_y
@@ -704,24 +1348,10 @@ def draw_infinite_map(screen, loaded_chunks, player):
         dist = math.hypot(chunk_x - player.world_x//CHUNK_SIZE, chunk_z - player.world_z//CHUNK_SIZE)
         alpha = max(50, 255 - int(dist / SETTINGS["render_distance"] * 200))
         
-        for x in range(CHUNK_SIZE):
-            for z_range in range(CHUNK_SIZE):
-                block_screen_x = chunk_screen_x + x * BLOCK_SIZE
-                block_screen_y = chunk_screen_z + z_range * BLOCK_SIZE
-                
-                if (block_screen_x + BLOCK_SIZE < 0 or block_screen_x > SCREEN_WIDTH or 
-                    block_screen_y + BLOCK_SIZE < 0 or block_screen_y > SCREEN_HEIGHT):
-                    continue
-                    
-                for y in range(Y_MAX-1, -1, -1):
-                    block_id = chunk.blocks[x][y][z_range]
-                    if block_id != 0:
-                        block_surf = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE))
-                        block_surf.fill(BLOCK_TYPES[block_id]["color"])
-                        block_surf.set_alpha(alpha)
-                        screen.blit(block_surf, (block_screen_x, block_screen_y))
-                        pygame.draw.rect(screen, GRAY, (block_screen_x, block_screen_y, BLOCK_SIZE, BLOCK_SIZE), 1)
-                        break
+        screen.blit(chunk_renderer.surface((chunk_x, chunk_z), chunk, alpha), chunk_rect)
+    # 屏幕上最多同时出现的区块数
+    chunk_pixels = CHUNK_SIZE * BLOCK_SIZE
+    chunk_renderer.trim((SCREEN_WIDTH // chunk_pixels + 2) * (SCREEN_HEIGHT // chunk_pixels + 2))
 
 def get_mouse_block(pos, player):
     """获取鼠标指向的方块"""
@@ -769,7 +1399,7 @@ class DropItem:
         self.spawn_time = time.time()
         self.last_update_time = time.time()
 
-    def update(self, loaded_chunks):
+    def update(self, world):
         current_time = time.time()
         delta_time = min(0.1, current_time - self.last_update_time)
         self.last_update_time = current_time
@@ -779,19 +1409,11 @@ class DropItem:
             self.velocity_z = min(self.velocity_z, 10)
             self.world_z += self.velocity_z * delta_time
             
-            chunk_x = int(self.world_x // CHUNK_SIZE)
-            chunk_z = int(self.world_z // CHUNK_SIZE)
-            if (chunk_x, chunk_z) in loaded_chunks:
-                chunk = loaded_chunks[(chunk_x, chunk_z)]
-                in_chunk_x = int(self.world_x % CHUNK_SIZE)
-                in_chunk_y = min(Y_MAX-1, max(0, int(self.world_z)))
-                in_chunk_z = int(self.world_z % CHUNK_SIZE)
-                
-                if (0 <= in_chunk_x < CHUNK_SIZE and 0 <= in_chunk_y < Y_MAX and 
-                    0 <= in_chunk_z < CHUNK_SIZE and chunk.blocks[in_chunk_x][in_chunk_y][in_chunk_z] != 0):
-                    self.on_ground = True
-                    self.velocity_z = 0
-                    self.world_z = chunk_z * CHUNK_SIZE + in_chunk_z
+            block_y = min(Y_MAX-1, max(0, int(self.world_z)))
+            if world.get_block(math.floor(self.world_x), block_y, math.floor(self.world_z)) != 0:
+                self.on_ground = True
+                self.velocity_z = 0
+                self.world_z = math.floor(self.world_z)
         
         if time.time() - self.spawn_time > 300:
             return False
@@ -813,51 +1435,751 @@ class DropItem:
             count_text = small_font.render(str(self.count), True, WHITE)
             screen.blit(count_text, (screen_x + 8, screen_y))
 
+def section_index_bits(palette_size):
+    """调色板大小对应的下标位宽（1/2/4/8位，一个字节内不跨界）"""
+    for bits in (1, 2, 4, 8):
+        if palette_size <= 1 << bits:
+            return bits
+    raise ValueError(f"调色板超出256种方块：{palette_size}")
+
+def pack_section_indices(indices, bits):
+    """把调色板下标按bits位压缩进bytearray，低位在前"""
+    per_byte = 8 // bits
+    data = bytearray((len(indices) + per_byte - 1) // per_byte)
+    for i, index in enumerate(indices):
+        data[i // per_byte] |= index << ((i % per_byte) * bits)
+    return data
+
+class PaletteSection:
+    """区块分段 - 局部调色板 + 位压缩下标
+    
+    存放z=0平面上SECTION_HEIGHT行的方块，格子下标为x*SECTION_HEIGHT+段内y；
+    下标位宽随调色板大小增长。整段只有一种方块时区块直接存该方块ID，不创建本类。
+    counts与palette一一对应，是段内各方块的数量（方块直方图）。
+    """
+    
+    CELLS = CHUNK_SIZE * SECTION_HEIGHT
+    
+    def __init__(self, cells):
+        histogram = Counter(cells)
+        self.palette = list(histogram)
+        self.counts = list(histogram.values())
+        self.bits = section_index_bits(len(self.palette))
+        lookup = {block_id: index for index, block_id in enumerate(self.palette)}
+        self.data = pack_section_indices([lookup[block_id] for block_id in cells], self.bits)
+    
+    def count(self, block_id):
+        """段内该方块的数量"""
+        try:
+            return self.counts[self.palette.index(block_id)]
+        except ValueError:
+            return 0
+    
+    def indices(self):
+        """解压全部格子的调色板下标"""
+        bits = self.bits
+        per_byte = 8 // bits
+        mask = (1 << bits) - 1
+        return [(byte >> (slot * bits)) & mask for byte in self.data for slot in range(per_byte)][:self.CELLS]
+    
+    def cells(self):
+        """全部格子的方块ID（bytes）"""
+        palette = self.palette
+        return bytes(palette[index] for index in self.indices())
+    
+    def get(self, cell):
+        per_byte = 8 // self.bits
+        byte = self.data[cell // per_byte]
+        return self.palette[(byte >> ((cell % per_byte) * self.bits)) & ((1 << self.bits) - 1)]
+    
+    def set(self, cell, block_id):
+        """写入一个格子并更新直方图；调色板装不下时整段按更大位宽重新压缩"""
+        try:
+            index = self.palette.index(block_id)
+        except ValueError:
+            self.palette.append(block_id)
+            self.counts.append(0)
+            index = len(self.palette) - 1
+            if len(self.palette) > 1 << self.bits:
+                indices = self.indices()
+                self.bits = section_index_bits(len(self.palette))
+                self.data = pack_section_indices(indices, self.bits)
+        per_byte = 8 // self.bits
+        shift = (cell % per_byte) * self.bits
+        mask = ((1 << self.bits) - 1) << shift
+        position = cell // per_byte
+        self.counts[(self.data[position] & mask) >> shift] -= 1
+        self.counts[index] += 1
+        self.data[position] = (self.data[position] & ~mask) | (index << shift)
+    
+    def storage_bytes(self):
+        """调色板与下标数据占用的字节数"""
+        return len(self.palette) + len(self.data)
+
+BlockChange = namedtuple("BlockChange", "chunk_key x y z old_block new_block")
+
+class BlockEventBus:
+    """方块修改事件总线 - 收集方块修改，每帧由主循环调用flush统一分发给订阅者
+    
+    订阅者收到本帧的BlockChange列表（区块坐标、区块内x/y/z、旧方块ID、新方块ID）。
+    同一格一帧内多次修改合并为一条（最早的旧值、最新的新值），改回原样的格子不分发；没有订阅者时不记录。
+    """
+    
+    def __init__(self):
+        self.subscribers = []
+        self.pending = {}
+    
+    def subscribe(self, callback):
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+    
+    def publish(self, chunk_key, x, y, z, old_block, new_block):
+        if not self.subscribers:
+            return
+        key = (chunk_key, x, y, z)
+        previous = self.pending.get(key)
+        self.pending[key] = (old_block if previous is None else previous[0], new_block)
+    
+    def publish_many(self, chunk_key, changes):
+        """批量发布同一区块的修改：changes为[(x, y, z, 旧方块ID, 新方块ID), ...]"""
+        if not self.subscribers:
+            return
+        pending = self.pending
+        get = pending.get
+        for x, y, z, old_block, new_block in changes:
+            key = (chunk_key, x, y, z)
+            previous = get(key)
+            pending[key] = (old_block if previous is None else previous[0], new_block)
+    
+    def flush(self):
+        """分发积攒的修改，返回分发的条数"""
+        if not self.pending:
+            return 0
+        changes = [BlockChange(chunk_key, x, y, z, old_block, new_block)
+                   for (chunk_key, x, y, z), (old_block, new_block) in self.pending.items() if old_block != new_block]
+        self.pending = {}
+        if changes:
+            for callback in list(self.subscribers):
+                callback(changes)
+        return len(changes)
+
 class Chunk:
-    def __init__(self, chunk_x, chunk_z, seed):
+    """区块 - 方块按固定高度分段存储，另有稀疏的平面外方块
+    
+    地形只生成在z=0平面上，该平面按y切成SECTION_HEIGHT行一段：整段同一方块时sections中
+    直接存方块ID，否则存PaletteSection。玩家放在其它z上的方块记录在extra_columns：
+    (x, z) -> {y: 方块ID}，只存非空气方块。所有方块读写都应通过get_block/set_block等方法进行。
+    heightmap记录每个非空列(x, z)最高非空气方块的y，随set_block增量维护。
+    edits记录相对生成地形被修改过的格子：(x, y, z) -> 原方块ID，改回原值时移除；
+    dirty表示上次存档后是否有修改。block_counts是整个区块非空气方块的直方图（方块ID -> 数量）。
+    """
+    
+    def __init__(self, chunk_x, chunk_z, seed, terrain_gen=None):
         self.chunk_x = chunk_x
         self.chunk_z = chunk_z
         self.seed = seed
         
-        self.terrain_gen = TerrainGenerator(seed)
+        self.terrain_gen = terrain_gen if terrain_gen is not None else get_terrain_generator(seed)
         
-        self.blocks = self.generate_chunk_blocks()
+        # 全空气/全深层石的区块所有分段都是单一方块，不占分段存储
+        chunk_data, _ = self.terrain_gen.generate_decorated_chunk(chunk_x, chunk_z)
+        self._load_plane(self.generate_chunk_blocks(chunk_data))
         self.last_accessed = time.time()
-
-    def generate_chunk_blocks(self):
-        blocks = [[[0 for _ in range(CHUNK_SIZE)] for _ in range(Y_MAX)] for _ in range(CHUNK_SIZE)]
+    
+    @classmethod
+    def from_terrain_plane(cls, chunk_x, chunk_z, seed, plane):
+        """用已生成的z=0平面数据构建区块，不再运行地形生成"""
+        chunk = cls.__new__(cls)
+        chunk.chunk_x = chunk_x
+        chunk.chunk_z = chunk_z
+        chunk.seed = seed
+        chunk.terrain_gen = get_terrain_generator(seed)
+        chunk._load_plane(plane)
+        chunk.last_accessed = time.time()
+        return chunk
+    
+    def _load_plane(self, plane):
+        """从按x、y顺序的z=0平面建立分段存储和高度图"""
+        self.sections = build_chunk_sections(plane)
+        self.extra_columns = {}
+        self.edits = {}
+        self.dirty = False
+        self.events = None      # 装入World时指向世界的BlockEventBus
+        self.block_counts = Counter(plane)
+        del self.block_counts[0]
+        self.heightmap = {}
+        for x in range(CHUNK_SIZE):
+            column = plane[x * Y_MAX:(x + 1) * Y_MAX].rstrip(b"\x00")
+            if column:
+                self.heightmap[(x, 0)] = len(column) - 1
+    
+    def terrain_plane(self):
+        """按x、y顺序导出z=0平面（生成的地形所在平面）"""
+        plane = bytearray(CHUNK_SIZE * Y_MAX)
+        for section_y, section in enumerate(self.sections):
+            y0 = section_y * SECTION_HEIGHT
+            if section.__class__ is int:
+                if section != 0:
+                    for x in range(CHUNK_SIZE):
+                        plane[x * Y_MAX + y0:x * Y_MAX + y0 + SECTION_HEIGHT] = bytes((section,)) * SECTION_HEIGHT
+                continue
+            cells = section.cells()
+            for x in range(CHUNK_SIZE):
+                plane[x * Y_MAX + y0:x * Y_MAX + y0 + SECTION_HEIGHT] = cells[x * SECTION_HEIGHT:(x + 1) * SECTION_HEIGHT]
+        return bytes(plane)
+    
+    def get_block(self, x, y, z):
+        """读取区块内坐标(x, y, z)的方块ID"""
+        if z == 0:
+            section = self.sections[y // SECTION_HEIGHT]
+            if section.__class__ is int:
+                return section
+            return section.get(x * SECTION_HEIGHT + y % SECTION_HEIGHT)
+        column = self.extra_columns.get((x, z))
+        if column is None:
+            return 0
+        return column.get(y, 0)
+    
+    def set_block(self, x, y, z, block_id):
+        """修改方块并记录修改、维护高度图；单一方块的分段第一次写入不同方块时才展开成调色板分段"""
+        old_block = self.get_block(x, y, z)
+        if old_block == block_id:
+            return
+        key = (x, y, z)
+        original = self.edits.setdefault(key, old_block)
+        if original == block_id:
+            del self.edits[key]
+        self.dirty = True
+        if old_block != 0:
+            self.block_counts[old_block] -= 1
+            if not self.block_counts[old_block]:
+                del self.block_counts[old_block]
+        if block_id != 0:
+            self.block_counts[block_id] += 1
         
-        chunk_data = self.terrain_gen.generate_chunk(self.chunk_x, self.chunk_z)
+        top_y = self.heightmap.get((x, z), -1)
+        self._store_block(x, y, z, block_id)
+        if block_id != 0:
+            if y > top_y:
+                self.heightmap[(x, z)] = y
+        elif y == top_y:
+            # 挖掉了最高的方块：向下找新的最高方块
+            for below_y in range(y - 1, -1, -1):
+                if self.get_block(x, below_y, z) != 0:
+                    self.heightmap[(x, z)] = below_y
+                    break
+            else:
+                del self.heightmap[(x, z)]
+        if self.events is not None:
+            self.events.publish((self.chunk_x, self.chunk_z), x, y, z, old_block, block_id)
+    
+    def _store_block(self, x, y, z, block_id):
+        if z == 0:
+            section_y = y // SECTION_HEIGHT
+            section = self.sections[section_y]
+            if section.__class__ is int:
+                if section == block_id:
+                    return
+                section = PaletteSection(bytes((section,)) * PaletteSection.CELLS)
+                self.sections[section_y] = section
+            section.set(x * SECTION_HEIGHT + y % SECTION_HEIGHT, block_id)
+            return
+        column = self.extra_columns.setdefault((x, z), {})
+        if block_id != 0:
+            column[y] = block_id
+        else:
+            column.pop(y, None)
+            if not column:
+                del self.extra_columns[(x, z)]
+    
+    # ---------- 批量读写：按分段一次解压、一次重建，修改记录/直方图/高度图/事件统一更新 ----------
+    def _section_cells(self, section_y):
+        section = self.sections[section_y]
+        if section.__class__ is int:
+            return bytearray((section,)) * PaletteSection.CELLS
+        return bytearray(section.cells())
+    
+    def _store_section(self, section_y, cells):
+        first = cells[0]
+        if cells.count(first) == len(cells):
+            self.sections[section_y] = first
+        else:
+            self.sections[section_y] = PaletteSection(bytes(cells))
+    
+    def _commit_changes(self, changes, column_tops=None):
+        """批量写入后的统一记账：changes为按写入顺序的[(x, y, z, 旧方块ID, 新方块ID), ...]
         
-        for x in range(CHUNK_SIZE):
-            for y in range(Y_MAX):
-                if y < len(chunk_data) and x < len(chunk_data[0]):
-                    blocks[x][y][0] = chunk_data[y][x]
-        
-        if random.random() < 0.1 and self.chunk_x == 0 and self.chunk_z == 0:
-            for x in range(3, 13):
-                surface_y = 0
-                for y in range(Y_MAX-1, -1, -1):
-                    if blocks[x][y][0] in [1, 2]:
-                        surface_y = y
-                        break
-                
-                if surface_y > 0 and random.random() < 0.3:
-                    trunk_height = random.randint(4, 7)
-                    for y in range(surface_y + 1, min(Y_MAX, surface_y + 1 + trunk_height)):
-                        blocks[x][y][0] = 5
-                    
-                    leaves_radius = 2
-                    leaf_top = min(Y_MAX-1, surface_y + trunk_height)
-                    for dx in range(-leaves_radius, leaves_radius + 1):
-                        for dy in range(-leaves_radius, 1):
-                            nx = x + dx
-                            ny = leaf_top + dy
-                            if 0 <= nx < CHUNK_SIZE and 0 <= ny < Y_MAX and math.hypot(dx, dy) <= leaves_radius:
-                                if blocks[nx][ny][0] == 0:
-                                    blocks[nx][ny][0] = 6
+        column_tops为{(x, z): 该列写入的最高非空气y（没有则为-1）}，调用者已知时传入，省去逐格统计。
+        """
+        if not changes:
+            return
+        self.dirty = True
+        edits = self.edits
+        setdefault = edits.setdefault
+        for x, y, z, old_block, block_id in changes:
+            key = (x, y, z)
+            if setdefault(key, old_block) == block_id:
+                del edits[key]
+        counts = self.block_counts
+        counts.subtract(Counter(change[3] for change in changes))
+        counts.update(Counter(change[4] for change in changes))
+        for block_id in [block_id for block_id, count in counts.items() if block_id == 0 or count <= 0]:
+            del counts[block_id]
+        if column_tops is None:
+            column_tops = {}
+            for x, y, z, old_block, block_id in changes:
+                if block_id != 0 and y > column_tops.get((x, z), -1):
+                    column_tops[(x, z)] = y
+                else:
+                    column_tops.setdefault((x, z), -1)
+        
+        heightmap = self.heightmap
+        get_block = self.get_block
+        for (x, z), written_top in column_tops.items():
+            top_y = max(heightmap.get((x, z), -1), written_top)
+            while top_y >= 0 and get_block(x, top_y, z) == 0:
+                top_y -= 1
+            if top_y >= 0:
+                heightmap[(x, z)] = top_y
+            else:
+                heightmap.pop((x, z), None)
         
+        if self.events is not None:
+            self.events.publish_many((self.chunk_x, self.chunk_z), changes)
+    
+    def fill_span(self, xs, zs, y0, y1, block_id):
+        """把区块内xs×[y0, y1]×zs填成同一方块，返回改变的格子数"""
+        changes = []
+        if 0 in zs:
+            for section_y in range(y0 // SECTION_HEIGHT, y1 // SECTION_HEIGHT + 1):
+                section = self.sections[section_y]
+                if section.__class__ is int and section == block_id:
+                    continue
+                base = section_y * SECTION_HEIGHT
+                low = max(y0, base) - base
+                high = min(y1, base + SECTION_HEIGHT - 1) - base
+                span = high - low + 1
+                filled = bytes((block_id,)) * span
+                cells = self._section_cells(section_y)
+                section_changed = False
+                for x in xs:
+                    start = x * SECTION_HEIGHT + low
+                    old = cells[start:start + span]
+                    if old == filled:
+                        continue
+                    changes.extend((x, base + low + i, 0, old_block, block_id) for i, old_block in enumerate(old) if old_block != block_id)
+                    cells[start:start + span] = filled
+                    section_changed = True
+                if section_changed:
+                    self._store_section(section_y, cells)
+        for z in zs:
+            if z == 0:
+                continue
+            for x in xs:
+                column = self.extra_columns.get((x, z))
+                if column is None:
+                    if block_id == 0:
+                        continue
+                    column = self.extra_columns[(x, z)] = {}
+                for y in range(y0, y1 + 1):
+                    old_block = column.get(y, 0)
+                    if old_block != block_id:
+                        changes.append((x, y, z, old_block, block_id))
+                        if block_id != 0:
+                            column[y] = block_id
+                        else:
+                            del column[y]
+                if not column:
+                    del self.extra_columns[(x, z)]
+        written_top = y1 if block_id != 0 else -1
+        self._commit_changes(changes, {(x, z): written_top for x in xs for z in zs})
+        return len(changes)
+    
+    def write_blocks(self, writes):
+        """批量写入[(x, y, z, 方块ID), ...]，z=0平面上每个涉及的分段只解压、重建一次，返回改变的格子数"""
+        by_section = {}
+        changes = []
+        for x, y, z, block_id in writes:
+            if z == 0:
+                by_section.setdefault(y // SECTION_HEIGHT, []).append((x, y, block_id))
+                continue
+            column = self.extra_columns.get((x, z))
+            old_block = column.get(y, 0) if column is not None else 0
+            if old_block == block_id:
+                continue
+            changes.append((x, y, z, old_block, block_id))
+            if block_id != 0:
+                self.extra_columns.setdefault((x, z), {})[y] = block_id
+            else:
+                del column[y]
+                if not column:
+                    del self.extra_columns[(x, z)]
+        for section_y, section_writes in by_section.items():
+            section = self.sections[section_y]
+            if section.__class__ is int and all(block_id == section for _, _, block_id in section_writes):
+                continue
+            cells = self._section_cells(section_y)
+            base = section_y * SECTION_HEIGHT
+            section_changed = False
+            for x, y, block_id in section_writes:
+                cell = x * SECTION_HEIGHT + y - base
+                old_block = cells[cell]
+                if old_block != block_id:
+                    changes.append((x, y, 0, old_block, block_id))
+                    cells[cell] = block_id
+                    section_changed = True
+            if section_changed:
+                self._store_section(section_y, cells)
+        self._commit_changes(changes)
+        return len(changes)
+    
+    def read_span(self, xs, zs, y0, y1):
+        """读取区块内xs×[y0, y1]×zs的非空气方块：{(x, y, z): 方块ID}，z=0平面按分段整段解压"""
+        blocks = {}
+        if 0 in zs:
+            for section_y in range(y0 // SECTION_HEIGHT, y1 // SECTION_HEIGHT + 1):
+                section = self.sections[section_y]
+                base = section_y * SECTION_HEIGHT
+                low = max(y0, base)
+                high = min(y1, base + SECTION_HEIGHT - 1)
+                if section.__class__ is int:
+                    if section != 0:
+                        blocks.update(((x, y, 0), section) for x in xs for y in range(low, high + 1))
+                    continue
+                cells = section.cells()
+                for x in xs:
+                    start = x * SECTION_HEIGHT - base
+                    blocks.update(((x, y, 0), cells[start + y]) for y in range(low, high + 1) if cells[start + y])
+        for (x, z), column in self.extra_columns.items():
+            if z != 0 and x in xs and z in zs:
+                blocks.update(((x, y, z), block_id) for y, block_id in column.items() if y0 <= y <= y1)
         return blocks
+    
+    def to_bytes(self):
+        """序列化区块内容（含平面外方块与修改记录，不含dirty标记），zlib压缩"""
+        extra = [(x, y, z, block_id) for (x, z), column in self.extra_columns.items() for y, block_id in column.items()]
+        edits = [(x, y, z, original) for (x, y, z), original in self.edits.items()]
+        header = struct.pack("<II", len(extra), len(edits))
+        return zlib.compress(header + self.terrain_plane() + bytes(v for cell in extra + edits for v in cell))
+    
+    @classmethod
+    def from_bytes(cls, chunk_x, chunk_z, seed, data):
+        """从to_bytes的结果恢复区块"""
+        raw = zlib.decompress(data)
+        extra_count, edit_count = struct.unpack_from("<II", raw)
+        offset = struct.calcsize("<II")
+        chunk = cls.from_terrain_plane(chunk_x, chunk_z, seed, raw[offset:offset + CHUNK_SIZE * Y_MAX])
+        offset += CHUNK_SIZE * Y_MAX
+        for i in range(extra_count):
+            x, y, z, block_id = raw[offset + i * 4:offset + i * 4 + 4]
+            chunk.extra_columns.setdefault((x, z), {})[y] = block_id
+            chunk.block_counts[block_id] += 1
+            chunk.heightmap[(x, z)] = max(y, chunk.heightmap.get((x, z), -1))
+        offset += extra_count * 4
+        for i in range(edit_count):
+            x, y, z, original = raw[offset + i * 4:offset + i * 4 + 4]
+            chunk.edits[(x, y, z)] = original
+        return chunk
+    
+    def edited_blocks(self):
+        """相对生成地形的全部修改，按坐标排序：[(x, y, z, 当前方块ID), ...]"""
+        return [(x, y, z, self.get_block(x, y, z)) for x, y, z in sorted(self.edits)]
+    
+    def mark_clean(self):
+        """当前内容已写入存档"""
+        self.dirty = False
+    
+    def count_block(self, block_id):
+        """区块内该方块的数量（读直方图）"""
+        return self.block_counts.get(block_id, 0)
+    
+    def find_block(self, block_id):
+        """区块内该方块的所有位置(x, y, z)；直方图中没有该方块的分段不扫描"""
+        if block_id == 0 or not self.block_counts.get(block_id):
+            return []
+        positions = []
+        for section_y, section in enumerate(self.sections):
+            y0 = section_y * SECTION_HEIGHT
+            if section.__class__ is int:
+                if section == block_id:
+                    positions.extend((x, y, 0) for x in range(CHUNK_SIZE) for y in range(y0, y0 + SECTION_HEIGHT))
+            elif section.count(block_id):
+                cells = section.cells()
+                positions.extend((cell // SECTION_HEIGHT, y0 + cell % SECTION_HEIGHT, 0)
+                                 for cell in range(len(cells)) if cells[cell] == block_id)
+        for (x, z), column in self.extra_columns.items():
+            positions.extend((x, y, z) for y, column_block in column.items() if column_block == block_id)
+        return positions
+    
+    def mined_count(self, block_id):
+        """生成时存在、后来被挖掉或替换的该方块数量（根据修改记录）"""
+        return sum(1 for (x, y, z), original in self.edits.items()
+                   if original == block_id and self.get_block(x, y, z) != block_id)
+    
+    def surface_y(self, x, z):
+        """(x, z)这一列最高非空气方块的y（读高度图），整列为空气时返回-1"""
+        return self.heightmap.get((x, z), -1)
+    
+    def top_block(self, x, z):
+        """(x, z)这一列中y最大的非空气方块ID，整列为空气时返回0"""
+        top_y = self.heightmap.get((x, z))
+        if top_y is None:
+            return 0
+        return self.get_block(x, top_y, z)
+    
+    def solid_blocks(self):
+        """按x、z、y顺序遍历所有非空气方块，产出(x, y, z, 方块ID)"""
+        extra_by_x = {}
+        for (x, z) in sorted(self.extra_columns):
+            extra_by_x.setdefault(x, []).append(z)
+        section_cells = [section if section.__class__ is int else section.cells() for section in self.sections]
+        for x in range(CHUNK_SIZE):
+            for section_y, cells in enumerate(section_cells):
+                if cells.__class__ is int:
+                    if cells != 0:
+                        for y in range(section_y * SECTION_HEIGHT, (section_y + 1) * SECTION_HEIGHT):
+                            yield x, y, 0, cells
+                    continue
+                offset = x * SECTION_HEIGHT
+                for local_y in range(SECTION_HEIGHT):
+                    block_id = cells[offset + local_y]
+                    if block_id != 0:
+                        yield x, section_y * SECTION_HEIGHT + local_y, 0, block_id
+            for z in extra_by_x.get(x, ()):
+                column = self.extra_columns[(x, z)]
+                for y in sorted(column):
+                    yield x, y, z, column[y]
+    
+    def dense_blocks(self):
+        """按x、y、z顺序展开成完整的CHUNK_SIZE×Y_MAX×CHUNK_SIZE字节串（只用于哈希与校验）"""
+        dense = bytearray(CHUNK_SIZE * Y_MAX * CHUNK_SIZE)
+        dense[0::CHUNK_SIZE] = self.terrain_plane()
+        for (x, z), column in self.extra_columns.items():
+            for y, block_id in column.items():
+                dense[(x * Y_MAX + y) * CHUNK_SIZE + z] = block_id
+        return bytes(dense)
+    
+    def storage_bytes(self):
+        """方块数据占用的字节数：调色板分段的调色板与下标，加上每个平面外方块1字节"""
+        return (sum(section.storage_bytes() for section in self.sections if section.__class__ is not int)
+                + sum(len(column) for column in self.extra_columns.values()))
+
+    def generate_chunk_blocks(self, chunk_data):
+        """把（已装饰的）地形数据写入z=0平面，返回按x、y顺序的平面数据"""
+        plane = bytearray(CHUNK_SIZE * Y_MAX)
+        
+        for x in range(CHUNK_SIZE):
+            offset = x * Y_MAX
+            for y in range(min(len(chunk_data), Y_MAX)):
+                if x < len(chunk_data[0]):
+                    plane[offset + y] = chunk_data[y][x]
+        
+        return plane
+
+def build_chunk_sections(plane):
+    """把按x、y顺序的z=0平面切成分段：单一方块的分段存方块ID，其余压缩成PaletteSection"""
+    sections = []
+    for y0 in range(0, Y_MAX, SECTION_HEIGHT):
+        cells = b"".join(plane[x * Y_MAX + y0:x * Y_MAX + y0 + SECTION_HEIGHT] for x in range(CHUNK_SIZE))
+        if cells.count(cells[0]) == len(cells):
+            sections.append(cells[0])
+        else:
+            sections.append(PaletteSection(cells))
+    return sections
+
+class World(OrderedDict):
+    """当前世界 - 已加载区块表（区块坐标 -> Chunk），并提供按世界坐标读写方块的接口
+    
+    世界坐标(x, y, z)对应区块(x // CHUNK_SIZE, z // CHUNK_SIZE)内的(x % CHUNK_SIZE, y, z % CHUNK_SIZE)。
+    最近一次访问的区块被缓存，连续访问同一区块时不再查表；区块表有任何增删都会清空缓存。
+    fill/replace/copy_region按区块分组，每个区块一次处理完它覆盖的部分。
+    装入的区块把方块修改发布到events（BlockEventBus），移出时断开。
+    """
+    
+    def __init__(self, *args, **kwargs):
+        self._last_key = None
+        self._last_chunk = None
+        self.events = BlockEventBus()
+        super().__init__(*args, **kwargs)
+    
+    def _invalidate(self):
+        self._last_key = None
+        self._last_chunk = None
+    
+    def __setitem__(self, key, chunk):
+        self._invalidate()
+        previous = self.get(key)
+        if previous is not None and previous is not chunk:
+            previous.events = None
+        chunk.events = self.events
+        super().__setitem__(key, chunk)
+    
+    def __delitem__(self, key):
+        self._invalidate()
+        self[key].events = None
+        super().__delitem__(key)
+    
+    def pop(self, key, *default):
+        self._invalidate()
+        if key in self:
+            self[key].events = None
+        return super().pop(key, *default)
+    
+    def popitem(self, last=True):
+        self._invalidate()
+        key, chunk = super().popitem(last)
+        chunk.events = None
+        return key, chunk
+    
+    def clear(self):
+        self._invalidate()
+        for chunk in self.values():
+            chunk.events = None
+        super().clear()
+    
+    def chunk_at(self, x, z):
+        """世界坐标(x, z)所在的已加载区块，未加载时返回None"""
+        key = (x // CHUNK_SIZE, z // CHUNK_SIZE)
+        if key == self._last_key:
+            return self._last_chunk
+        chunk = self.get(key)
+        if chunk is not None:
+            self._last_key = key
+            self._last_chunk = chunk
+        return chunk
+    
+    def get_block(self, x, y, z):
+        """世界坐标处的方块ID；区块未加载或y越界时视为空气"""
+        if not 0 <= y < Y_MAX:
+            return 0
+        chunk = self.chunk_at(x, z)
+        if chunk is None:
+            return 0
+        return chunk.get_block(x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+    
+    def set_block(self, x, y, z, block_id):
+        """修改世界坐标处的方块，返回是否写入（区块未加载或y越界时不写）"""
+        if not 0 <= y < Y_MAX:
+            return False
+        chunk = self.chunk_at(x, z)
+        if chunk is None:
+            return False
+        chunk.set_block(x % CHUNK_SIZE, y, z % CHUNK_SIZE, block_id)
+        return True
+    
+    def chunk_spans(self, x0, z0, x1, z1):
+        """把世界坐标矩形[x0, x1]×[z0, z1]按已加载区块切分，产出(区块, 区块内x范围, 区块内z范围, 区块世界原点)"""
+        for chunk_x in range(x0 // CHUNK_SIZE, x1 // CHUNK_SIZE + 1):
+            for chunk_z in range(z0 // CHUNK_SIZE, z1 // CHUNK_SIZE + 1):
+                chunk = self.get((chunk_x, chunk_z))
+                if chunk is None:
+                    continue
+                origin_x = chunk_x * CHUNK_SIZE
+                origin_z = chunk_z * CHUNK_SIZE
+                xs = range(max(x0, origin_x) - origin_x, min(x1, origin_x + CHUNK_SIZE - 1) - origin_x + 1)
+                zs = range(max(z0, origin_z) - origin_z, min(z1, origin_z + CHUNK_SIZE - 1) - origin_z + 1)
+                yield chunk, xs, zs, (origin_x, origin_z)
+    
+    def fill(self, x0, y0, z0, x1, y1, z1, block_id):
+        """把长方体（含两端）内已加载的部分填成同一方块，返回改变的格子数"""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        y0, y1 = max(0, y0), min(Y_MAX - 1, y1)
+        z0, z1 = sorted((z0, z1))
+        if y0 > y1:
+            return 0
+        return sum(chunk.fill_span(xs, zs, y0, y1, block_id) for chunk, xs, zs, _ in self.chunk_spans(x0, z0, x1, z1))
+    
+    def replace(self, x0, y0, z0, x1, y1, z1, from_id, to_id):
+        """把长方体内的from_id换成to_id，返回替换的格子数；直方图中没有from_id的区块直接跳过"""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        y0, y1 = max(0, y0), min(Y_MAX - 1, y1)
+        z0, z1 = sorted((z0, z1))
+        if y0 > y1 or from_id == to_id:
+            return 0
+        replaced = 0
+        for chunk, xs, zs, _ in self.chunk_spans(x0, z0, x1, z1):
+            if from_id == 0:
+                # 空气不在直方图里：读出非空气方块，其余格子都是空气
+                solid = chunk.read_span(xs, zs, y0, y1)
+                writes = [(x, y, z, to_id) for x in xs for z in zs for y in range(y0, y1 + 1) if (x, y, z) not in solid]
+            elif chunk.count_block(from_id):
+                writes = [(x, y, z, to_id) for x, y, z in chunk.find_block(from_id)
+                          if x in xs and z in zs and y0 <= y <= y1]
+            else:
+                continue
+            replaced += chunk.write_blocks(writes)
+        return replaced
+    
+    def copy_region(self, x0, y0, z0, x1, y1, z1, dest_x, dest_y, dest_z):
+        """把长方体复制到以(dest_x, dest_y, dest_z)为最小角的位置（源与目标可重叠），返回写入的格子数
+        
+        先按源区块整段读出，再按目标区块批量写入；未加载的源区块按空气复制，未加载的目标区块跳过。
+        """
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        y0, y1 = max(0, y0), min(Y_MAX - 1, y1)
+        z0, z1 = sorted((z0, z1))
+        if y0 > y1:
+            return 0
+        source = {}
+        for chunk, xs, zs, (origin_x, origin_z) in self.chunk_spans(x0, z0, x1, z1):
+            for (x, y, z), block_id in chunk.read_span(xs, zs, y0, y1).items():
+                source[(origin_x + x - x0, y - y0, origin_z + z - z0)] = block_id
+        
+        written = 0
+        dest_ys = [(dy, dest_y + dy) for dy in range(y1 - y0 + 1) if 0 <= dest_y + dy < Y_MAX]
+        for chunk, xs, zs, (origin_x, origin_z) in self.chunk_spans(dest_x, dest_z, dest_x + x1 - x0, dest_z + z1 - z0):
+            writes = []
+            for x in xs:
+                src_x = origin_x + x - dest_x
+                for z in zs:
+                    src_z = origin_z + z - dest_z
+                    writes.extend((x, y, z, source.get((src_x, dy, src_z), 0)) for dy, y in dest_ys)
+            chunk.write_blocks(writes)
+            written += len(writes)
+        return written
+
+# 当前世界
+LOADED_CHUNKS = World()
+
+def count_blocks(loaded_chunks, block_id):
+    """已加载区块中该方块的总数（只读各区块的直方图）"""
+    return sum(chunk.count_block(block_id) for chunk in loaded_chunks.values())
+
+def find_nearest_block(loaded_chunks, block_id, world_x, world_y, world_z):
+    """离(world_x, world_y, world_z)最近的该方块的世界坐标，没有时返回None
+    
+    直方图中没有该方块的区块直接跳过；区块按水平距离下界由近到远扫描，下界超过已找到的距离即停止。
+    """
+    candidates = []
+    for (chunk_x, chunk_z), chunk in loaded_chunks.items():
+        if chunk.count_block(block_id):
+            dx = max(chunk_x * CHUNK_SIZE - world_x, 0, world_x - (chunk_x + 1) * CHUNK_SIZE)
+            dz = max(chunk_z * CHUNK_SIZE - world_z, 0, world_z - (chunk_z + 1) * CHUNK_SIZE)
+            candidates.append((math.hypot(dx, dz), chunk_x, chunk_z, chunk))
+    candidates.sort(key=lambda candidate: candidate[0])
+    
+    best = None
+    best_distance = float("inf")
+    for bound, chunk_x, chunk_z, chunk in candidates:
+        if bound > best_distance:
+            break
+        for x, y, z in chunk.find_block(block_id):
+            position = (chunk_x * CHUNK_SIZE + x, y, chunk_z * CHUNK_SIZE + z)
+            distance = math.dist(position, (world_x, world_y, world_z))
+            if distance < best_distance:
+                best, best_distance = position, distance
+    return best
+
+def chunks_storage_bytes(loaded_chunks):
+    """已加载区块的方块数据总字节数"""
+    return sum(chunk.storage_bytes() for chunk in loaded_chunks.values())
 
 class Player:
     def __init__(self, x, y, name="Player"):
@@ -905,26 +2227,20 @@ class Player:
             chunk_screen_x = chunk_x * CHUNK_SIZE * BLOCK_SIZE - self.world_x * BLOCK_SIZE + SCREEN_WIDTH//2
             chunk_screen_z = chunk_z * CHUNK_SIZE * BLOCK_SIZE - self.world_z * BLOCK_SIZE + SCREEN_HEIGHT//2
             
-            for x in range(CHUNK_SIZE):
-                for z_range in range(CHUNK_SIZE):
-                    for y in range(Y_MAX):
-                        block_id = chunk.blocks[x][y][z_range]
-                        if block_id == 0:
-                            continue
-                            
-                        block_screen_x = chunk_screen_x + x * BLOCK_SIZE
-                        block_screen_y = chunk_screen_z + y * BLOCK_SIZE
-                        block_rect = pygame.Rect(block_screen_x, block_screen_y, BLOCK_SIZE, BLOCK_SIZE)
-                        
-                        if player_rect.colliderect(block_rect):
-                            if self.velocity_y > 0:
-                                self.y = block_screen_y - self.height
-                                self.velocity_y = 0
-                                self.on_ground = True
-                                self.z = y
-                            elif self.velocity_y < 0:
-                                self.y = block_screen_y + BLOCK_SIZE
-                                self.velocity_y = 0
+            for x, y, z_range, block_id in chunk.solid_blocks():
+                block_screen_x = chunk_screen_x + x * BLOCK_SIZE
+                block_screen_y = chunk_screen_z + y * BLOCK_SIZE
+                block_rect = pygame.Rect(block_screen_x, block_screen_y, BLOCK_SIZE, BLOCK_SIZE)
+                
+                if player_rect.colliderect(block_rect):
+                    if self.velocity_y > 0:
+                        self.y = block_screen_y - self.height
+                        self.velocity_y = 0
+                        self.on_ground = True
+                        self.z = y
+                    elif self.velocity_y < 0:
+                        self.y = block_screen_y + BLOCK_SIZE
+                        self.velocity_y = 0
         
         keys = pygame.key.get_pressed()
         move_speed = self.speed * delta_time * 60
@@ -1027,6 +2343,8 @@ class Player:
         if show_fps:
             fps_text = small_font.render(f"FPS: {get_current_fps()}", True, WHITE)
             screen.blit(fps_text, (SCREEN_WIDTH - 100, 10))
+            storage_text = small_font.render(f"区块: {len(LOADED_CHUNKS)} / {chunks_storage_bytes(LOADED_CHUNKS) // 1024} KB", True, WHITE)
+            screen.blit(storage_text, (SCREEN_WIDTH - 200, 35))
         
         if self.bag_open:
             self.draw_bag(screen)
@@ -1114,72 +2432,959 @@ class Monster:
         self.attack_damage = 5
         self.last_update_time = time.time()
 
-    def update(self, player, loaded_chunks):
-        current_time = time.time()
-        delta_time = min(0.1, current_time - self.last_update_time)
-        self.last_update_time = current_time
+    def update(self, player, world):
+        current_time = time.time()
+        delta_time = min(0.1, current_time - self.last_update_time)
+        self.last_update_time = current_time
+        
+        if is_day:
+            return False
+        
+        dx = player.world_x - self.world_x
+        dz = player.world_z - self.world_z
+        distance = math.hypot(dx, dz)
+        
+        if distance > 15:
+            return True
+        
+        if distance > self.attack_range:
+            move_speed = self.speed * delta_time * 60
+            self.world_x += (dx / distance) * move_speed / BLOCK_SIZE
+            self.world_z += (dz / distance) * move_speed / BLOCK_SIZE
+        
+        self.attack_cooldown = max(0, self.attack_cooldown - 1)
+        if distance <= self.attack_range and self.attack_cooldown == 0:
+            player.hp = max(0, player.hp - self.attack_damage)
+            play_sound("hurt")
+            self.attack_cooldown = FPS * 2
+            if game_logger:
+                game_logger.info(f"玩家{player.name}被僵尸攻击，HP:{player.hp}")
+        
+        block_y = min(Y_MAX-1, max(0, int(self.world_z)))
+        if world.get_block(math.floor(self.world_x), block_y, math.floor(self.world_z)) != 0:
+            self.world_x -= (dx / distance) * 0.1 if distance != 0 else 0
+            self.world_z -= (dz / distance) * 0.1 if distance != 0 else 0
+        
+        if self.hp <= 0:
+            if random.random() < 0.5:
+                DROPS.append(DropItem(self.world_x, self.world_z, 9, 1))
+            if game_logger:
+                game_logger.info(f"僵尸死亡，位置:({int(self.world_x)},{int(self.world_z)})")
+            return False
+            
+        return True
+
+    def draw(self, screen, player):
+        screen_x = int((self.world_x - player.world_x) * BLOCK_SIZE + SCREEN_WIDTH // 2)
+        screen_y = int((self.world_z - player.world_z) * BLOCK_SIZE + SCREEN_HEIGHT // 2)
+        
+        if (screen_x < -self.width or screen_x > SCREEN_WIDTH or 
+            screen_y < -self.height or screen_y > SCREEN_HEIGHT):
+            return
+            
+        monster_rect = pygame.Rect(screen_x, screen_y, self.width, self.height)
+        pygame.draw.rect(screen, RED, monster_rect)
+        
+        hp_bar_x = screen_x
+        hp_bar_y = screen_y - 10
+        pygame.draw.rect(screen, BLACK, (hp_bar_x, hp_bar_y, self.width, 5))
+        fill_width = int(self.hp / 50 * self.width)
+        pygame.draw.rect(screen, RED, (hp_bar_x, hp_bar_y, fill_width, 5))
+
+# ---------------------- 预生成区块存储 ----------------------
+class PregeneratedChunkStore:
+    """预生成区块存储 - 每个种子一个目录，每个区块一个压缩文件
+    
+    区块文件先写临时文件再原子替换，中断后重新运行即可从断点继续。
+    manifest.json记录种子和地形参数签名，参数变化后的数据不会被游戏读取。
+    """
+    
+    def __init__(self, root, seed):
+        self.root = root
+        self.seed = seed
+        self.path = os.path.join(root, str(seed))
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self.signature = get_terrain_generator(seed).signature()
+    
+    def read_manifest(self):
+        """读取存储清单，不存在或损坏时返回None"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def is_compatible(self):
+        """存储是否由当前的地形参数生成"""
+        manifest = self.read_manifest()
+        return (manifest is not None and manifest.get("seed") == self.seed
+                and manifest.get("signature") == self.signature)
+    
+    def prepare(self, force=False):
+        """创建（或校验）存储目录；参数不一致时只有force=True才会清空旧数据"""
+        manifest = self.read_manifest()
+        if manifest is not None and not self.is_compatible():
+            if not force:
+                return False
+            for name in os.listdir(self.path):
+                if name.endswith(".bin"):
+                    os.remove(os.path.join(self.path, name))
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"seed": self.seed, "signature": self.signature, "chunk_size": CHUNK_SIZE, "y_max": Y_MAX}, f, indent=2)
+        return True
+    
+    def chunk_path(self, chunk_x, chunk_z):
+        return os.path.join(self.path, f"c.{chunk_x}.{chunk_z}.bin")
+    
+    def existing_chunks(self):
+        """已写入的区块坐标集合"""
+        chunks = set()
+        if not os.path.isdir(self.path):
+            return chunks
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if len(parts) == 4 and parts[0] == "c" and parts[3] == "bin":
+                try:
+                    chunks.add((int(parts[1]), int(parts[2])))
+                except ValueError:
+                    continue
+        return chunks
+    
+    def write_chunk(self, chunk_x, chunk_z, plane):
+        """原子写入一个区块的z=0平面数据"""
+        path = self.chunk_path(chunk_x, chunk_z)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(zlib.compress(plane))
+        os.replace(temp_path, path)
+    
+    def read_chunk(self, chunk_x, chunk_z):
+        """读取区块的z=0平面数据，不存在或损坏时返回None"""
+        try:
+            with open(self.chunk_path(chunk_x, chunk_z), "rb") as f:
+                plane = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+        if len(plane) != CHUNK_SIZE * Y_MAX:
+            return None
+        return plane
+
+# 已打开的预生成存储：(种子, 噪声后端) -> PregeneratedChunkStore或None
+PREGENERATED_STORES = {}
+
+def get_pregenerated_store(seed):
+    """获取与当前地形参数一致的预生成存储，没有则返回None"""
+    key = (seed, WORLD_NOISE_BACKEND)
+    if key not in PREGENERATED_STORES:
+        store = PregeneratedChunkStore(PREGEN_DIR, seed)
+        PREGENERATED_STORES[key] = store if store.is_compatible() else None
+    return PREGENERATED_STORES[key]
+
+# ---------------------- 已生成区块缓存 ----------------------
+GENERATED_CACHE_MAGIC = b"SGGC"
+GENERATED_CACHE_HEADER = struct.Struct("<4sI")  # 魔数, 平面数据CRC32
+
+class GeneratedChunkCache:
+    """已生成（未经修改）区块的磁盘缓存 - 键为(种子, 地形参数签名, 区块坐标)
+    
+    每个区块一个文件，内容为魔数、CRC32和压缩的z=0平面；校验失败的文件删除后重新生成。
+    签名随地形参数和算法版本变化，旧参数的数据不会再命中，由LRU淘汰。
+    最近访问顺序记在内存中的OrderedDict里（启动时按文件修改时间排序），总大小超出max_bytes时从最久未访问的一端删除。
+    锁只保护索引，文件读写和压缩都在锁外进行，各生成线程不会互相等待磁盘。
+    """
+    
+    def __init__(self, root, max_bytes=GENERATED_CACHE_BUDGET):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None         # 文件路径 -> 大小，按最近访问排序（最久的在前），首次使用时扫描目录
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.corrupt = 0
+    
+    def chunk_path(self, seed, signature, chunk_x, chunk_z):
+        return os.path.join(self.root, f"{seed}.{signature}", f"c.{chunk_x}.{chunk_z}.bin")
+    
+    def _ensure_index(self):
+        if self.entries is not None:
+            return
+        found = []
+        if os.path.isdir(self.root):
+            for world in os.scandir(self.root):
+                if not world.is_dir():
+                    continue
+                for entry in os.scandir(world.path):
+                    if entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.path, stat.st_size))
+        found.sort()
+        with self.lock:
+            if self.entries is None:
+                self.entries = OrderedDict((path, size) for _, path, size in found)
+                self.total_bytes = sum(size for _, _, size in found)
+    
+    def _forget(self, path):
+        """从索引中移除（调用者持有锁），文件由调用者在锁外删除"""
+        self.total_bytes -= self.entries.pop(path, 0)
+    
+    @staticmethod
+    def _delete_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def read_plane(self, seed, signature, chunk_x, chunk_z):
+        """读取缓存的z=0平面，未命中或校验失败时返回None"""
+        self._ensure_index()
+        path = self.chunk_path(seed, signature, chunk_x, chunk_z)
+        with self.lock:
+            if path not in self.entries:
+                self.misses += 1
+                return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, crc = GENERATED_CACHE_HEADER.unpack_from(data)
+            plane = zlib.decompress(data[GENERATED_CACHE_HEADER.size:])
+            if magic != GENERATED_CACHE_MAGIC or zlib.crc32(plane) != crc or len(plane) != CHUNK_SIZE * Y_MAX:
+                raise ValueError("校验失败")
+        except (OSError, ValueError, struct.error, zlib.error):
+            with self.lock:
+                self._forget(path)
+                self.corrupt += 1
+                self.misses += 1
+            self._delete_files([path])
+            return None
+        with self.lock:
+            if path in self.entries:
+                self.entries.move_to_end(path)
+            self.hits += 1
+        return plane
+    
+    def write_plane(self, seed, signature, chunk_x, chunk_z, plane):
+        """写入一个区块的z=0平面，超出容量时淘汰最久未访问的区块"""
+        self._ensure_index()
+        path = self.chunk_path(seed, signature, chunk_x, chunk_z)
+        data = GENERATED_CACHE_HEADER.pack(GENERATED_CACHE_MAGIC, zlib.crc32(plane)) + zlib.compress(plane)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            if game_logger:
+                game_logger.warning(f"写入区块缓存失败：{e}")
+            return
+        evicted = []
+        with self.lock:
+            self._forget(path)
+            self.entries[path] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_path, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                evicted.append(old_path)
+        self._delete_files(evicted)
+    
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "corrupt": self.corrupt,
+                "files": len(self.entries or ()), "bytes": self.total_bytes}
+
+# 游戏进程中的已生成区块缓存（main中启用；命令行工具不使用）
+GENERATED_CHUNK_CACHE = None
+
+def create_chunk(chunk_x, chunk_z, seed):
+    """获取一个未经修改的区块：优先读取预生成存储和已生成区块缓存，否则运行地形生成"""
+    store = get_pregenerated_store(seed)
+    if store is not None:
+        plane = store.read_chunk(chunk_x, chunk_z)
+        if plane is not None:
+            return Chunk.from_terrain_plane(chunk_x, chunk_z, seed, plane)
+    cache = GENERATED_CHUNK_CACHE
+    if cache is None:
+        return Chunk(chunk_x, chunk_z, seed)
+    signature = get_terrain_generator(seed).signature()
+    plane = cache.read_plane(seed, signature, chunk_x, chunk_z)
+    if plane is not None:
+        return Chunk.from_terrain_plane(chunk_x, chunk_z, seed, plane)
+    chunk = Chunk(chunk_x, chunk_z, seed)
+    cache.write_plane(seed, signature, chunk_x, chunk_z, chunk.terrain_plane())
+    return chunk
+
+# ---------------------- 区域文件存储 ----------------------
+REGION_MAGIC = b"SGRL"
+REGION_INDEX_COUNT = struct.Struct("<I")       # 索引块：项数 ... CRC32
+REGION_INDEX_ENTRY = struct.Struct("<HIII")    # 区块下标, 偏移, 长度, CRC32
+
+def encode_chunk_edits(edits):
+    """把[(x, y, z, 方块ID), ...]编码为区域文件中的区块数据：与存档相同的游程 + varint编码，再zlib压缩"""
+    body = bytearray()
+    encode_edit_runs(body, edits)
+    return zlib.compress(bytes(body))
+
+def decode_chunk_edits(data):
+    return decode_edit_runs(zlib.decompress(data), 0)[0]
+
+def fsync_directory(path):
+    """fsync目录，让其中文件的创建与重命名落盘；不支持打开目录的系统（Windows）上跳过"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_file_atomic(path, data):
+    """先写临时文件并fsync，再原子替换目标文件，并fsync所在目录"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    fsync_directory(os.path.dirname(path))
+
+class RegionChunkStore:
+    """区域文件存储 - 一个世界一个目录，每REGION_SIZE×REGION_SIZE个区块一个只追加的二进制文件
+
+    区块数据只追加到文件末尾、从不原地覆盖。每次存档在改动过的区域文件末尾追加一个新的索引块
+    (区块下标 -> 偏移, 长度, CRC32)，再写出代号递增的清单gen.<代号>.json，记录各区域索引块的位置。
+    存档文件记下自己对应的代号，主存档与各备份读取各自那一代的索引，互不影响；
+    不再被任何存档引用的代由collect_garbage删除，它们占用的字节由compact()回收。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.generation = None
+        self.index = {}      # 区域坐标 -> {区块下标: (偏移, 长度, CRC32)}
+        self.locations = {}  # 区域坐标 -> (文件名, 索引块偏移, 索引块长度)
+
+    @staticmethod
+    def region_of(chunk_x, chunk_z):
+        """区块所在区域坐标及其在索引中的下标"""
+        return (chunk_x // REGION_SIZE, chunk_z // REGION_SIZE), (chunk_z % REGION_SIZE) * REGION_SIZE + chunk_x % REGION_SIZE
+
+    def manifest_path(self, generation):
+        return os.path.join(self.path, f"gen.{generation}.json")
+
+    def generations(self):
+        """目录中已有清单的代号"""
+        generations = []
+        if not os.path.isdir(self.path):
+            return generations
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[0] == "gen" and parts[2] == "json" and parts[1].isdigit():
+                generations.append(int(parts[1]))
+        return sorted(generations)
+
+    def read_manifest(self, generation):
+        try:
+            with open(self.manifest_path(generation), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def region_files(self, region):
+        """目录中某区域的全部文件：[(纪元, 文件名), ...]，压缩后的文件纪元加一"""
+        files = []
+        prefix = f"r.{region[0]}.{region[1]}."
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                epoch = name[len(prefix):-len(".bin")]
+                if name.startswith(prefix) and name.endswith(".bin") and epoch.isdigit():
+                    files.append((int(epoch), name))
+        return sorted(files)
+
+    @staticmethod
+    def pack_index(entries):
+        block = REGION_INDEX_COUNT.pack(len(entries)) + b"".join(
+            REGION_INDEX_ENTRY.pack(index, *entries[index]) for index in sorted(entries))
+        return block + REGION_INDEX_COUNT.pack(zlib.crc32(block))
+
+    def read_index(self, file_name, offset, length):
+        """读取并校验一个索引块，返回{区块下标: (偏移, 长度, CRC32)}"""
+        with open(os.path.join(self.path, file_name), "rb") as f:
+            f.seek(offset)
+            block = f.read(length)
+        if len(block) != length or length < 2 * REGION_INDEX_COUNT.size:
+            raise ValueError(f"区域索引不完整：{file_name}")
+        count, = REGION_INDEX_COUNT.unpack_from(block)
+        crc, = REGION_INDEX_COUNT.unpack_from(block, length - REGION_INDEX_COUNT.size)
+        if length != 2 * REGION_INDEX_COUNT.size + count * REGION_INDEX_ENTRY.size or zlib.crc32(block[:-REGION_INDEX_COUNT.size]) != crc:
+            raise ValueError(f"区域索引损坏：{file_name}")
+        entries = block[REGION_INDEX_COUNT.size:-REGION_INDEX_COUNT.size]
+        return {index: (data_offset, data_length, data_crc)
+                for index, data_offset, data_length, data_crc in REGION_INDEX_ENTRY.iter_unpack(entries)}
+
+    def open_generation(self, generation):
+        """切换到某一代的索引，generation为None时为空世界；清单缺失或索引损坏时抛出ValueError"""
+        index = {}
+        locations = {}
+        if generation is not None:
+            manifest = self.read_manifest(generation)
+            if manifest is None:
+                raise ValueError(f"区域清单不存在：{self.manifest_path(generation)}")
+            for key, (file_name, offset, length) in manifest["regions"].items():
+                region = tuple(map(int, key.split(",")))
+                try:
+                    index[region] = self.read_index(file_name, offset, length)
+                except OSError as e:
+                    raise ValueError(f"区域文件无法读取：{file_name}") from e
+                locations[region] = (file_name, offset, length)
+        with self.lock:
+            self.generation = generation
+            self.index = index
+            self.locations = locations
+
+    def read_chunk(self, chunk_x, chunk_z):
+        """读取当前一代中一个区块的数据，不存在或校验失败时返回None"""
+        region, index = self.region_of(chunk_x, chunk_z)
+        with self.lock:
+            entry = self.index.get(region, {}).get(index)
+            if entry is None:
+                return None
+            file_name = self.locations[region][0]
+        offset, length, crc = entry
+        # 文件只追加，已索引的字节不会再变，读取不需要持锁
+        try:
+            with open(os.path.join(self.path, file_name), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                data = view[offset:offset + length]
+        except (OSError, ValueError):
+            return None
+        if len(data) != length or zlib.crc32(data) != crc:
+            if game_logger:
+                game_logger.warning(f"区域文件中的区块数据损坏：({chunk_x}, {chunk_z})")
+            return None
+        return data
+
+    def commit(self, seed, noise_backend, updates):
+        """把{(区块x, 区块z): 数据}追加写入区域文件（数据为空表示删除该区块），再写出新一代清单
+
+        已有字节一律不改，中途中断时各代的数据与索引都完好，只在文件末尾留下无人引用的字节。
+        返回(代号, 索引)，存档文件写好后用activate切换到新一代；没有修改时沿用当前一代。
+        """
+        with self.lock:
+            generation = self.generation
+            index = dict(self.index)
+            locations = dict(self.locations)
+        if not updates and generation is not None:
+            return generation, (index, locations)
+
+        changes_by_region = {}
+        for (chunk_x, chunk_z), data in updates.items():
+            region, slot = self.region_of(chunk_x, chunk_z)
+            changes_by_region.setdefault(region, []).append((slot, data))
+        os.makedirs(self.path, exist_ok=True)
+        for region, changes in changes_by_region.items():
+            entries = dict(index.get(region, {}))
+            if not entries and not any(data for _, data in changes):
+                continue
+            if region in locations:
+                file_name = locations[region][0]
+            else:
+                files = self.region_files(region)
+                file_name = files[-1][1] if files else f"r.{region[0]}.{region[1]}.0.bin"
+            with open(os.path.join(self.path, file_name), "ab") as f:
+                if f.tell() == 0:
+                    f.write(REGION_MAGIC)
+                for slot, data in changes:
+                    if data:
+                        entries[slot] = (f.tell(), len(data), zlib.crc32(data))
+                        f.write(data)
+                    else:
+                        entries.pop(slot, None)
+                block = self.pack_index(entries)
+                offset = f.tell()
+                f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+            if entries:
+                index[region] = entries
+                locations[region] = (file_name, offset, len(block))
+            else:
+                index.pop(region, None)
+                locations.pop(region, None)
+
+        generation = max(self.generations(), default=0) + 1
+        manifest = {
+            "generation": generation,
+            "seed": seed,
+            "noise_backend": noise_backend,
+            "region_size": REGION_SIZE,
+            "regions": {f"{x},{z}": list(location) for (x, z), location in sorted(locations.items())},
+        }
+        # 清单与新建的区域文件都落盘后才返回，之后写入的存档文件引用它不会指向不存在的数据
+        write_file_atomic(self.manifest_path(generation), json.dumps(manifest, indent=2).encode("utf-8"))
+        return generation, (index, locations)
+
+    def activate(self, generation, state):
+        """存档文件已引用新一代，切换当前索引"""
+        with self.lock:
+            self.generation = generation
+            self.index, self.locations = state
+
+    def chunks(self):
+        """当前一代中全部区块的坐标"""
+        with self.lock:
+            return [(region[0] * REGION_SIZE + index % REGION_SIZE, region[1] * REGION_SIZE + index // REGION_SIZE)
+                    for region, entries in self.index.items() for index in entries]
+
+    def collect_garbage(self, live_generations):
+        """删除不在live_generations中的清单及不再被任何清单引用的区域文件，目录空了就一并删除，返回删除的文件数"""
+        live_generations = set(live_generations)
+        if self.generation is not None:
+            live_generations.add(self.generation)
+        removed = 0
+        referenced = set()
+        with self.lock:
+            for generation in self.generations():
+                if generation not in live_generations:
+                    os.remove(self.manifest_path(generation))
+                    removed += 1
+                    continue
+                manifest = self.read_manifest(generation)
+                if manifest is None:
+                    # 读不出的清单无法判断引用了哪些文件，保守起见不删任何区域文件
+                    return removed
+                referenced.update(location[0] for location in manifest["regions"].values())
+            for name in os.listdir(self.path):
+                if name.endswith(".tmp") or (name.startswith("r.") and name.endswith(".bin") and name not in referenced):
+                    os.remove(os.path.join(self.path, name))
+                    removed += 1
+            if not os.listdir(self.path):
+                os.rmdir(self.path)
+        return removed
+
+    def compact(self, min_dead_ratio=0.0):
+        """重写无用数据占比超过min_dead_ratio的区域文件，只保留各代清单仍引用的数据，返回回收的字节数
+
+        压缩结果写成纪元加一的新文件并fsync，然后逐个改写引用旧文件的清单，最后才删除旧文件；
+        中途中断时每份清单仍指向一个完整的文件。只能在没有游戏读写该世界时调用。
+        """
+        manifests = {}
+        for generation in self.generations():
+            manifest = self.read_manifest(generation)
+            if manifest is None:
+                return 0
+            manifests[generation] = manifest
+        users = {}  # 文件名 -> [(代号, 区域键, 索引块偏移, 索引块长度), ...]
+        for generation, manifest in manifests.items():
+            for key, (file_name, offset, length) in manifest["regions"].items():
+                users.setdefault(file_name, []).append((generation, key, offset, length))
+
+        reclaimed = 0
+        with self.lock:
+            for file_name, references in users.items():
+                path = os.path.join(self.path, file_name)
+                size = os.path.getsize(path)
+                index_blocks = {}  # 索引块偏移 -> (长度, 索引)，相邻几代未改动的区域共用同一索引块
+                for _, _, offset, length in references:
+                    if offset not in index_blocks:
+                        index_blocks[offset] = (length, self.read_index(file_name, offset, length))
+                live = {}
+                for _, entries in index_blocks.values():
+                    for data_offset, data_length, _ in entries.values():
+                        live[data_offset] = data_length
+                live_bytes = len(REGION_MAGIC) + sum(live.values()) + sum(length for length, _ in index_blocks.values())
+                dead = size - live_bytes
+                if dead <= 0 or dead < (size - len(REGION_MAGIC)) * min_dead_ratio:
+                    continue
+
+                with open(path, "rb") as f:
+                    content = f.read()
+                output = bytearray(REGION_MAGIC)
+                moved = {}
+                for data_offset in sorted(live):
+                    moved[data_offset] = len(output)
+                    output += content[data_offset:data_offset + live[data_offset]]
+                moved_blocks = {}
+                for offset in sorted(index_blocks):
+                    block = self.pack_index({slot: (moved[data_offset], data_length, crc)
+                                             for slot, (data_offset, data_length, crc) in index_blocks[offset][1].items()})
+                    moved_blocks[offset] = (len(output), len(block))
+                    output += block
+                region = tuple(map(int, file_name.split(".")[1:3]))
+                new_name = f"r.{region[0]}.{region[1]}.{self.region_files(region)[-1][0] + 1}.bin"
+                write_file_atomic(os.path.join(self.path, new_name), bytes(output))
+
+                for generation in sorted({reference[0] for reference in references}):
+                    manifest = manifests[generation]
+                    for reference_generation, key, offset, _ in references:
+                        if reference_generation == generation:
+                            manifest["regions"][key] = [new_name, *moved_blocks[offset]]
+                    write_file_atomic(self.manifest_path(generation), json.dumps(manifest, indent=2).encode("utf-8"))
+                os.remove(path)
+                reclaimed += size - len(output)
+        return reclaimed
+
+def get_region_store_path(save_dir, player_name):
+    """玩家的区域数据目录（与存档及其备份在同一目录），其中每个世界一个子目录"""
+    return os.path.join(save_dir, f"{player_name}_regions")
+
+def get_world_region_path(save_dir, player_name, seed, noise_backend):
+    """某个世界（种子 + 噪声后端）的区域文件目录；同名玩家开新世界不会动到旧世界备份引用的数据"""
+    return os.path.join(get_region_store_path(save_dir, player_name), f"{seed}.{noise_backend}")
+
+# 当前世界的区域存储（加载存档或第一次存档时设置）
+WORLD_REGION_STORE = None
+
+def load_world_chunk(chunk_x, chunk_z, seed):
+    """获取当前世界的区块：未经修改的区块，叠加区域存储中保存的修改"""
+    chunk = create_chunk(chunk_x, chunk_z, seed)
+    store = WORLD_REGION_STORE
+    if store is not None:
+        data = store.read_chunk(chunk_x, chunk_z)
+        if data is not None:
+            for x, y, z, block_id in decode_chunk_edits(data):
+                if 0 <= x < CHUNK_SIZE and 0 <= y < Y_MAX and 0 <= z < CHUNK_SIZE:
+                    chunk.set_block(x, y, z, block_id)
+            chunk.mark_clean()
+    return chunk
+
+# ---------------------- 后台区块生成 ----------------------
+class ChunkGenerationService:
+    """后台区块生成服务 - 工作线程池 + 按距离优先的请求队列"""
+    
+    def __init__(self, seed, workers=CHUNK_GEN_WORKERS):
+        self.seed = seed
+        self.condition = threading.Condition()
+        self.request_heap = []      # (优先级, 序号, 区块坐标)
+        self.pending = set()        # 已请求但尚未装入的区块（排队、生成中、已完成）
+        self.cancelled = set()      # 生成中途被取消的区块
+        self.ready = []             # 已生成、等待主线程装入的(区块坐标, Chunk)
+        self.center = None
+        self.radius = RENDER_DISTANCE
+        self.keep = set()           # 正方形范围之外仍需保留的区块（如预取区块）
+        self.sequence = 0
+        self.running = True
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"chunk-gen-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def _priority(self, key):
+        """离中心越近优先级越高（调用方需持有锁）"""
+        if self.center is None:
+            return 0
+        dx = key[0] - self.center[0]
+        dz = key[1] - self.center[1]
+        return dx * dx + dz * dz
+    
+    def _in_range(self, key):
+        """区块是否仍在加载范围内（调用方需持有锁）"""
+        if self.center is None or key in self.keep:
+            return True
+        return max(abs(key[0] - self.center[0]), abs(key[1] - self.center[1])) <= self.radius
+    
+    def is_pending(self, key):
+        """区块是否已在生成流程中"""
+        with self.condition:
+            return key in self.pending
+    
+    def pending_keys(self):
+        """返回尚未装入的区块坐标快照"""
+        with self.condition:
+            return set(self.pending)
+    
+    def request(self, key):
+        """请求后台生成区块"""
+        with self.condition:
+            if not self.running or key in self.pending:
+                return
+            self.pending.add(key)
+            self.cancelled.discard(key)
+            heapq.heappush(self.request_heap, (self._priority(key), self.sequence, key))
+            self.sequence += 1
+            self.condition.notify()
+    
+    def retarget(self, center_x, center_z, radius, keep=()):
+        """更新加载中心：取消超出范围（且不在keep中）的请求，并按新距离重排队列"""
+        keep = set(keep)
+        with self.condition:
+            if self.center == (center_x, center_z) and self.radius == radius and self.keep == keep:
+                return
+            self.center = (center_x, center_z)
+            self.radius = radius
+            self.keep = keep
+            
+            queued = set()
+            new_heap = []
+            for _, sequence, key in self.request_heap:
+                queued.add(key)
+                if self._in_range(key):
+                    new_heap.append((self._priority(key), sequence, key))
+                else:
+                    self.pending.discard(key)
+            heapq.heapify(new_heap)
+            self.request_heap = new_heap
+            
+            # 正在生成的区块无法中断，完成后丢弃结果
+            for key in list(self.pending):
+                if key not in queued and not self._in_range(key):
+                    self.pending.discard(key)
+                    self.cancelled.add(key)
+            self.ready = [(key, chunk) for key, chunk in self.ready if self._in_range(key)]
+    
+    def _worker_loop(self):
+        """工作线程：按优先级取出请求并生成区块"""
+        while True:
+            with self.condition:
+                while self.running and not self.request_heap:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                _, _, key = heapq.heappop(self.request_heap)
+            
+            try:
+                chunk = load_world_chunk(key[0], key[1], self.seed)
+            except Exception as e:
+                if game_logger:
+                    game_logger.exception(f"后台生成区块失败 {key}", e)
+                with self.condition:
+                    self.pending.discard(key)
+                continue
+            
+            with self.condition:
+                if key in self.cancelled:
+                    self.cancelled.discard(key)
+                    continue
+                if self.running:
+                    self.ready.append((key, chunk))
+    
+    def install_ready(self, loaded_chunks, limit=MAX_CHUNK_INSTALLS_PER_FRAME):
+        """在主线程中把已生成的区块装入loaded_chunks，返回装入数量"""
+        with self.condition:
+            batch = self.ready[:limit]
+            del self.ready[:limit]
+            for key, _ in batch:
+                self.pending.discard(key)
+        
+        installed = 0
+        for key, chunk in batch:
+            if key not in loaded_chunks:
+                loaded_chunks[key] = chunk
+                installed += 1
+        return installed
+    
+    def shutdown(self):
+        """停止服务并丢弃所有未完成的请求"""
+        with self.condition:
+            self.running = False
+            self.request_heap = []
+            self.pending.clear()
+            self.ready = []
+            self.condition.notify_all()
+
+class ChunkResidencyPolicy:
+    """区块驻留策略 - 沿移动方向预取，加载/卸载半径分离，并保证最短驻留时间
+    
+    只在玩家跨越区块时重新评估，避免在边界附近来回走动时反复生成同一批区块。
+    指定tiers（ChunkTierManager）时，卸载的区块交给它保存，再次需要时优先从中取回。
+    """
+    
+    def __init__(self, seed, load_radius=None, unload_radius=None,
+                 prefetch_distance=CHUNK_PREFETCH_DISTANCE, min_residency=CHUNK_MIN_RESIDENCY, tiers=None):
+        self.seed = seed
+        self.tiers = tiers
+        self.load_radius = RENDER_DISTANCE if load_radius is None else load_radius
+        self.unload_radius = self.load_radius + CHUNK_UNLOAD_MARGIN if unload_radius is None else unload_radius
+        self.prefetch_distance = prefetch_distance
+        self.min_residency = min_residency
+        self.resident_since = {}
+        self.wanted = set()
+        self.last_center = None
+    
+    def wanted_chunks(self, center_x, center_z, movement=(0, 0)):
+        """需要驻留的区块：加载半径内的正方形，加上沿移动方向平移后的预取正方形"""
+        wanted = set()
+        step_x = (movement[0] > 0.1) - (movement[0] < -0.1)
+        step_z = (movement[1] > 0.1) - (movement[1] < -0.1)
+        centers = [(center_x, center_z)]
+        if (step_x or step_z) and self.prefetch_distance > 0:
+            centers.append((center_x + step_x * self.prefetch_distance, center_z + step_z * self.prefetch_distance))
         
-        if is_day:
+        for base_x, base_z in centers:
+            for dx in range(-self.load_radius, self.load_radius + 1):
+                for dz in range(-self.load_radius, self.load_radius + 1):
+                    wanted.add((base_x + dx, base_z + dz))
+        return wanted
+    
+    def update(self, player, loaded_chunks, service=None, movement=(0, 0)):
+        """玩家进入新区块时重新评估驻留集合，返回本次是否进行了评估"""
+        center_x = int(player.world_x // CHUNK_SIZE)
+        center_z = int(player.world_z // CHUNK_SIZE)
+        if (center_x, center_z) == self.last_center:
             return False
+        self.last_center = (center_x, center_z)
+        now = time.time()
         
-        dx = player.world_x - self.world_x
-        dz = player.world_z - self.world_z
-        distance = math.hypot(dx, dz)
-        
-        if distance > 15:
-            return True
-        
-        if distance > self.attack_range:
-            move_speed = self.speed * delta_time * 60
-            self.world_x += (dx / distance) * move_speed / BLOCK_SIZE
-            self.world_z += (dz / distance) * move_speed / BLOCK_SIZE
+        self.wanted = self.wanted_chunks(center_x, center_z, movement)
+        if service is not None:
+            service.retarget(center_x, center_z, self.load_radius, self.wanted)
         
-        self.attack_cooldown = max(0, self.attack_cooldown - 1)
-        if distance <= self.attack_range and self.attack_cooldown == 0:
-            player.hp = max(0, player.hp - self.attack_damage)
-            play_sound("hurt")
-            self.attack_cooldown = FPS * 2
-            if game_logger:
-                game_logger.info(f"玩家{player.name}被僵尸攻击，HP:{player.hp}")
+        # 由近到远请求缺失的区块
+        for key in sorted(self.wanted, key=lambda k: (k[0] - center_x) ** 2 + (k[1] - center_z) ** 2):
+            if key in loaded_chunks:
+                loaded_chunks[key].last_accessed = now
+                continue
+            self.resident_since[key] = now
+            chunk = self.tiers.take(key) if self.tiers is not None else None
+            if chunk is not None:
+                loaded_chunks[key] = chunk
+            elif service is not None:
+                service.request(key)
+            else:
+                loaded_chunks[key] = load_world_chunk(key[0], key[1], self.seed)
         
-        chunk_x = int(self.world_x // CHUNK_SIZE)
-        chunk_z = int(self.world_z // CHUNK_SIZE)
-        if (chunk_x, chunk_z) in loaded_chunks:
-            chunk = loaded_chunks[(chunk_x, chunk_z)]
-            in_chunk_x = int(self.world_x % CHUNK_SIZE)
-            in_chunk_y = min(Y_MAX-1, max(0, int(self.world_z)))
-            in_chunk_z = int(self.world_z % CHUNK_SIZE)
-            
-            if (0 <= in_chunk_x < CHUNK_SIZE and 0 <= in_chunk_y < Y_MAX and 
-                0 <= in_chunk_z < CHUNK_SIZE and chunk.blocks[in_chunk_x][in_chunk_y][in_chunk_z] != 0):
-                self.world_x -= (dx / distance) * 0.1 if distance != 0 else 0
-                self.world_z -= (dz / distance) * 0.1 if distance != 0 else 0
+        # 超出卸载半径且驻留时间足够的区块才卸载
+        chunks_to_unload = []
+        for key in loaded_chunks:
+            since = self.resident_since.setdefault(key, now)
+            if key in self.wanted:
+                continue
+            if math.hypot(key[0] - center_x, key[1] - center_z) <= self.unload_radius:
+                continue
+            if now - since >= self.min_residency:
+                chunks_to_unload.append(key)
+        for key in chunks_to_unload:
+            chunk = loaded_chunks.pop(key)
+            if self.tiers is not None:
+                self.tiers.demote(key, chunk)
         
-        if self.hp <= 0:
-            if random.random() < 0.5:
-                DROPS.append(DropItem(self.world_x, self.world_z, 9, 1))
-            if game_logger:
-                game_logger.info(f"僵尸死亡，位置:({int(self.world_x)},{int(self.world_z)})")
-            return False
-            
+        for key in list(self.resident_since):
+            if key not in loaded_chunks and key not in self.wanted:
+                del self.resident_since[key]
         return True
 
-    def draw(self, screen, player):
-        screen_x = int((self.world_x - player.world_x) * BLOCK_SIZE + SCREEN_WIDTH // 2)
-        screen_y = int((self.world_z - player.world_z) * BLOCK_SIZE + SCREEN_HEIGHT // 2)
-        
-        if (screen_x < -self.width or screen_x > SCREEN_WIDTH or 
-            screen_y < -self.height or screen_y > SCREEN_HEIGHT):
-            return
-            
-        monster_rect = pygame.Rect(screen_x, screen_y, self.width, self.height)
-        pygame.draw.rect(screen, RED, monster_rect)
-        
-        hp_bar_x = screen_x
-        hp_bar_y = screen_y - 10
-        pygame.draw.rect(screen, BLACK, (hp_bar_x, hp_bar_y, self.width, 5))
-        fill_width = int(self.hp / 50 * self.width)
-        pygame.draw.rect(screen, RED, (hp_bar_x, hp_bar_y, fill_width, 5))
+# ---------------------- 区块分级驻留 ----------------------
+class ChunkTierManager:
+    """离开范围的区块分级保存：热（LOADED_CHUNKS中的活区块）→ 温（内存中压缩）→ 冷（磁盘）
+    
+    温区块按Chunk.last_accessed做LRU，总字节数超出预算时最久未访问的写入冷存储；
+    冷存储是本局游戏的临时目录，开局时清空，存档时温、冷区块的修改会一并写入。
+    """
+    
+    def __init__(self, seed, warm_budget=CHUNK_WARM_BUDGET, cold_root=CHUNK_SWAP_DIR):
+        self.seed = seed
+        self.warm_budget = warm_budget
+        self.warm = {}              # 区块坐标 -> (压缩数据, last_accessed)
+        self.warm_bytes = 0
+        self.cold_path = os.path.join(cold_root, str(seed))
+        self.cold = set()
+        self.dirty = set()          # 温层/冷层中上次存档后有修改的区块
+        self.saving = set()         # 已进入存档快照、但后台尚未读取的冷区块
+        self.warm_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear_cold()
+    
+    def cold_file(self, key):
+        return os.path.join(self.cold_path, f"c.{key[0]}.{key[1]}.bin")
+    
+    def clear_cold(self):
+        """删除冷存储中的全部区块文件"""
+        if os.path.isdir(self.cold_path):
+            for name in os.listdir(self.cold_path):
+                if name.endswith(".bin"):
+                    os.remove(os.path.join(self.cold_path, name))
+        self.cold.clear()
+    
+    def demote(self, key, chunk):
+        """卸载的活区块压缩后放入温层，必要时把最久未访问的温区块写入冷层"""
+        data = chunk.to_bytes()
+        if chunk.dirty:
+            self.dirty.add(key)
+        self.warm[key] = (data, chunk.last_accessed)
+        self.warm_bytes += len(data)
+        while self.warm_bytes > self.warm_budget and self.warm:
+            self._evict(min(self.warm, key=lambda k: self.warm[k][1]))
+    
+    def _evict(self, key):
+        data, _ = self.warm.pop(key)
+        self.warm_bytes -= len(data)
+        os.makedirs(self.cold_path, exist_ok=True)
+        path = self.cold_file(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.cold.add(key)
+        self.evictions += 1
+    
+    def _read_cold(self, key):
+        try:
+            with open(self.cold_file(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def take(self, key):
+        """取回温层或冷层中的区块（从该层移除），都没有时返回None"""
+        entry = self.warm.pop(key, None)
+        if entry is not None:
+            self.warm_bytes -= len(entry[0])
+            self.warm_hits += 1
+            data = entry[0]
+        elif key in self.cold:
+            self.cold.discard(key)
+            data = self._read_cold(key)
+            if data is None:
+                self.misses += 1
+                return None
+            try:
+                os.remove(self.cold_file(key))
+            except OSError:
+                pass    # 后台存档正在读取该文件，留给clear_cold删除
+            self.cold_hits += 1
+        else:
+            self.misses += 1
+            return None
+        chunk = Chunk.from_bytes(key[0], key[1], self.seed, data)
+        chunk.dirty = key in self.dirty or key in self.saving
+        self.dirty.discard(key)
+        chunk.last_accessed = time.time()
+        return chunk
+    
+    def begin_save(self):
+        """为后台存档取出有修改的区块并清除dirty标记：温区块直接给出压缩数据，冷区块给None（由后台线程read_cold读取）"""
+        stored = []
+        for key in sorted(self.dirty):
+            if key in self.warm:
+                stored.append((key, self.warm[key][0]))
+            elif key in self.cold:
+                stored.append((key, None))
+                self.saving.add(key)
+        self.dirty.clear()
+        return stored
+    
+    def read_cold(self, key):
+        """后台存档读取冷区块；区块已被取回时返回None（取回的区块会带着dirty标记）"""
+        return self._read_cold(key) if key in self.cold else None
+    
+    def end_save(self):
+        self.saving.clear()
+    
+    def holds(self, key):
+        return key in self.warm or key in self.cold
+    
+    def stats(self):
+        """各层命中、未命中与淘汰计数"""
+        return {"warm_chunks": len(self.warm), "warm_bytes": self.warm_bytes, "cold_chunks": len(self.cold),
+                "warm_hits": self.warm_hits, "cold_hits": self.cold_hits,
+                "misses": self.misses, "evictions": self.evictions}
 
 # ---------------------- 设置管理 ----------------------
 def load_settings():
@@ -1200,6 +3405,11 @@ def load_settings():
     VIRTUAL_BUTTONS_ENABLED = SETTINGS["virtual_buttons"]
     RENDER_DISTANCE = SETTINGS["render_distance"]
     FPS = SETTINGS["fps_limit"]
+    # 手改或来自其它版本的设置可能含有未注册的噪声后端，退回经典柏林噪声
+    if SETTINGS.get("noise_backend") not in NOISE_BACKENDS:
+        if game_logger:
+            game_logger.warning(f"未知的噪声后端设置：{SETTINGS.get('noise_backend')}，改用perlin")
+        SETTINGS["noise_backend"] = "perlin"
     
     for sound in SOUNDS.values():
         if sound:
@@ -1225,70 +3435,393 @@ def save_settings():
         return False
 
 # ---------------------- 存档模块 ----------------------
+SAVE_EXTENSION = ".sav"
+LEGACY_SAVE_EXTENSION = ".json"
+SAVE_MAGIC = b"SGSV"
+SAVE_FORMAT_VERSION = 1
+SAVE_HEADER = struct.Struct("<4sH")
+
+def write_varint(out, value):
+    """无符号LEB128变长整数"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def write_svarint(out, value):
+    """有符号整数先做zigzag映射再写变长整数"""
+    write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+def read_svarint(data, offset):
+    value, offset = read_varint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+def write_save_string(out, text):
+    raw = text.encode("utf-8")
+    write_varint(out, len(raw))
+    out += raw
+
+def read_save_string(data, offset):
+    length, offset = read_varint(data, offset)
+    return bytes(data[offset:offset + length]).decode("utf-8"), offset + length
+
+def encode_edit_runs(out, edits):
+    """把[(x, y, z, 方块ID), ...]按列排序，同一列连续y上的相同方块合并为一段：(x, z, 起始y, 长度, 方块ID)"""
+    runs = []
+    for x, y, z, block_id in sorted(edits, key=lambda edit: (edit[0], edit[2], edit[1])):
+        if runs:
+            run = runs[-1]
+            if (run[0], run[1], run[2] + run[3], run[4]) == (x, z, y, block_id):
+                run[3] += 1
+                continue
+        runs.append([x, z, y, 1, block_id])
+    write_varint(out, len(runs))
+    for x, z, y, length, block_id in runs:
+        for value in (x, z, y, length - 1, block_id):
+            write_varint(out, value)
+
+def decode_edit_runs(data, offset):
+    count, offset = read_varint(data, offset)
+    edits = []
+    for _ in range(count):
+        values = []
+        for _ in range(5):
+            value, offset = read_varint(data, offset)
+            values.append(value)
+        x, z, y, length, block_id = values
+        edits.extend((x, y + i, z, block_id) for i in range(length + 1))
+    return edits, offset
+
+def encode_save_data(save_data):
+    """把存档字典编码为二进制存档：文件头 + zlib压缩的(世界信息, 玩家记录, 游戏状态, 区块修改记录)"""
+    body = bytearray()
+    world_seed = save_data.get("world_seed")
+    body.append(0 if world_seed is None else 1)
+    if world_seed is not None:
+        write_varint(body, world_seed)
+    write_save_string(body, save_data.get("noise_backend", "perlin"))
+    write_save_string(body, save_data.get("chunk_store") or "")
+    write_varint(body, save_data.get("region_generation") or 0)
+    
+    player = save_data["player"]
+    write_save_string(body, player["name"])
+    for value in (player["hp"], player.get("hunger", 100), player["level"], player.get("current_tool", 0)):
+        write_svarint(body, int(value))
+    for table in (player.get("tools", {}), player.get("inventory", {})):
+        write_varint(body, len(table))
+        for item_id, count in table.items():
+            write_varint(body, int(item_id))
+            write_svarint(body, int(count))
+    position = player["position"]
+    body += struct.pack("<ddd", position["world_x"], position["world_z"], position["z"])
+    # 游戏状态字段少且不固定，保留为紧凑JSON
+    write_save_string(body, json.dumps(save_data.get("game_state", {}), ensure_ascii=False, separators=(",", ":")))
+    
+    chunks = save_data.get("loaded_chunks", {})
+    write_varint(body, len(chunks))
+    for chunk_key_str, blocks in chunks.items():
+        chunk_x, chunk_z = map(int, chunk_key_str.split(","))
+        write_svarint(body, chunk_x)
+        write_svarint(body, chunk_z)
+        encode_edit_runs(body, blocks)
+    return SAVE_HEADER.pack(SAVE_MAGIC, SAVE_FORMAT_VERSION) + zlib.compress(bytes(body))
+
+def decode_save_data(data):
+    """解码二进制存档，返回与JSON存档相同结构的字典"""
+    magic, version = SAVE_HEADER.unpack_from(data)
+    if magic != SAVE_MAGIC:
+        raise ValueError("不是二进制存档")
+    if version > SAVE_FORMAT_VERSION:
+        raise ValueError(f"存档版本过新：{version}")
+    body = zlib.decompress(data[SAVE_HEADER.size:])
+    
+    save_data = {}
+    offset = 1
+    if body[0]:
+        save_data["world_seed"], offset = read_varint(body, offset)
+    else:
+        save_data["world_seed"] = None
+    save_data["noise_backend"], offset = read_save_string(body, offset)
+    chunk_store, offset = read_save_string(body, offset)
+    if chunk_store:
+        save_data["chunk_store"] = chunk_store
+    region_generation, offset = read_varint(body, offset)
+    if region_generation:
+        save_data["region_generation"] = region_generation
+    
+    player = {}
+    player["name"], offset = read_save_string(body, offset)
+    for field in ("hp", "hunger", "level", "current_tool"):
+        player[field], offset = read_svarint(body, offset)
+    for field in ("tools", "inventory"):
+        table = {}
+        count, offset = read_varint(body, offset)
+        for _ in range(count):
+            item_id, offset = read_varint(body, offset)
+            table[item_id], offset = read_svarint(body, offset)
+        player[field] = table
+    world_x, world_z, z = struct.unpack_from("<ddd", body, offset)
+    offset += struct.calcsize("<ddd")
+    player["position"] = {"world_x": world_x, "world_z": world_z, "z": z}
+    save_data["player"] = player
+    game_state, offset = read_save_string(body, offset)
+    save_data["game_state"] = json.loads(game_state)
+    
+    chunks = {}
+    count, offset = read_varint(body, offset)
+    for _ in range(count):
+        chunk_x, offset = read_svarint(body, offset)
+        chunk_z, offset = read_svarint(body, offset)
+        chunks[f"{chunk_x},{chunk_z}"], offset = decode_edit_runs(body, offset)
+    if chunks:
+        save_data["loaded_chunks"] = chunks
+    return save_data
+
+def read_save_data(file_path):
+    """读取存档文件，按文件头自动识别二进制存档或旧版JSON存档"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    if data[:len(SAVE_MAGIC)] == SAVE_MAGIC:
+        return decode_save_data(data)
+    return json.loads(data.decode("utf-8"))
+
 def get_save_path(player_name):
-    return os.path.join(SAVE_DIR, f"{player_name}.json")
+    return os.path.join(SAVE_DIR, f"{player_name}{SAVE_EXTENSION}")
 
-def create_json_file(file_path, data, loaded_chunks, world_seed):
-    try:
-        save_data = {
-            "player": data["player"],
+def find_save_file(player_name):
+    """玩家已有的主存档路径（优先二进制存档，其次旧版JSON），都不存在时返回二进制存档路径"""
+    for extension in (SAVE_EXTENSION, LEGACY_SAVE_EXTENSION):
+        path = os.path.join(SAVE_DIR, f"{player_name}{extension}")
+        if os.path.exists(path):
+            return path
+    return get_save_path(player_name)
+
+def save_file_paths(save_dir, player_name):
+    """玩家已有的主存档与各备份文件（两种格式）"""
+    stems = [player_name] + [f"{player_name}_backup{i}" for i in range(1, 4)]
+    paths = [os.path.join(save_dir, stem + extension) for stem in stems for extension in (SAVE_EXTENSION, LEGACY_SAVE_EXTENSION)]
+    return [path for path in paths if os.path.exists(path)]
+
+def delete_save(player_name):
+    """删除玩家的主存档、全部备份与区域数据；备份依赖区域数据，不能只删区域数据而留下备份"""
+    for path in save_file_paths(SAVE_DIR, player_name):
+        os.remove(path)
+    shutil.rmtree(get_region_store_path(SAVE_DIR, player_name), ignore_errors=True)
+
+def collect_region_garbage(save_dir, player_name):
+    """删除玩家主存档与各备份都不再引用的区域数据（清单、区域文件、整个世界目录），返回删除的文件数"""
+    references = {}
+    for path in save_file_paths(save_dir, player_name):
+        # 有存档读不出来时无法确定它引用了什么，这次不删任何数据
+        save_data = read_save_data(path)
+        generation = save_data.get("region_generation")
+        if save_data.get("chunk_store") != "region" or generation is None:
+            continue
+        world_path = get_world_region_path(save_dir, player_name, save_data["world_seed"], save_data.get("noise_backend", "perlin"))
+        references.setdefault(world_path, set()).add(generation)
+    
+    root = get_region_store_path(save_dir, player_name)
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            removed += RegionChunkStore(path).collect_garbage(references.get(path, ()))
+    return removed
+
+def snapshot_save(file_path, data, loaded_chunks, world_seed, chunk_tiers=None):
+    """在主线程为存档拍快照：复制玩家数据，取出所有有修改区块的修改记录并清除其dirty标记
+    
+    快照交给write_save_snapshot写盘，可以在后台线程进行；写盘失败时用restore_save_snapshot恢复dirty标记。
+    """
+    global WORLD_REGION_STORE
+    # 新世界第一次存档时才建立区域存储；之后各次存档都在它当前一代的基础上写出新一代
+    world_path = get_world_region_path(os.path.dirname(file_path), data["player"]["name"], world_seed, WORLD_NOISE_BACKEND)
+    if WORLD_REGION_STORE is None or os.path.abspath(WORLD_REGION_STORE.path) != os.path.abspath(world_path):
+        WORLD_REGION_STORE = RegionChunkStore(world_path)
+    chunk_edits = []
+    for key, chunk in loaded_chunks.items():
+        if chunk.dirty:
+            chunk_edits.append((key, chunk.edited_blocks()))
+            chunk.mark_clean()
+    return {
+        "save_data": {
+            "player": copy.deepcopy(data["player"]),
             "world_seed": world_seed,
-            "loaded_chunks": {},
-            "game_state": data["game_state"]
-        }
+            "noise_backend": WORLD_NOISE_BACKEND,
+            "chunk_store": "region",
+            "game_state": copy.deepcopy(data["game_state"])
+        },
+        "chunk_edits": chunk_edits,
+        "region_store": WORLD_REGION_STORE,
+        "stored_chunks": chunk_tiers.begin_save() if chunk_tiers is not None else [],
+        "chunk_tiers": chunk_tiers,
+    }
+
+def restore_save_snapshot(snapshot, loaded_chunks):
+    """写盘失败：快照中的区块重新标记为dirty，下次存档再写"""
+    chunk_tiers = snapshot["chunk_tiers"]
+    for key, _ in snapshot["chunk_edits"] + snapshot["stored_chunks"]:
+        if key in loaded_chunks:
+            loaded_chunks[key].dirty = True
+        elif chunk_tiers is not None and chunk_tiers.holds(key):
+            chunk_tiers.dirty.add(key)
+
+def write_save_snapshot(file_path, snapshot):
+    """把快照写入区域文件和二进制存档
+    
+    先把区块修改追加进区域文件并写出新一代清单（均已fsync），再写存档临时文件并fsync，
+    最后原子替换主存档——这一步是提交点：之前中断时主存档仍引用旧一代，旧一代的数据没有被改动过；
+    之后中断时新存档与新一代区域数据都已落盘。整文件的compact()不在存档时进行。
+    """
+    try:
+        file_path = os.path.splitext(file_path)[0] + SAVE_EXTENSION
+        save_data = snapshot["save_data"]
+        world_seed = save_data["world_seed"]
+        chunk_tiers = snapshot["chunk_tiers"]
         
-        for (chunk_x, chunk_z), chunk in loaded_chunks.items():
-            default_chunk = Chunk(chunk_x, chunk_z, world_seed)
-            non_default_blocks = []
-            for x in range(CHUNK_SIZE):
-                for y in range(Y_MAX):
-                    for z_range in range(CHUNK_SIZE):
-                        current = chunk.blocks[x][y][z_range]
-                        default = default_chunk.blocks[x][y][z_range]
-                        if current != 0 and current != default:
-                            non_default_blocks.append((x, y, z_range, current))
-            save_data["loaded_chunks"][f"{chunk_x},{chunk_z}"] = non_default_blocks
+        # 区块修改追加写入区域文件并生成新一代清单，只写上次存档后有变化的区块（包括已卸载到温层/冷层的）
+        store = snapshot["region_store"]
+        chunk_edits = list(snapshot["chunk_edits"])
+        for (chunk_x, chunk_z), data in snapshot["stored_chunks"]:
+            if data is None:
+                data = chunk_tiers.read_cold((chunk_x, chunk_z))
+                if data is None:
+                    continue
+            chunk_edits.append(((chunk_x, chunk_z), Chunk.from_bytes(chunk_x, chunk_z, world_seed, data).edited_blocks()))
+        updates = {key: encode_chunk_edits(edits) if edits else None for key, edits in chunk_edits}
+        region_generation, region_state = store.commit(world_seed, save_data["noise_backend"], updates)
+        save_data = dict(save_data, region_generation=region_generation)
         
         dir_path = os.path.dirname(file_path)
         if not os.path.exists(dir_path):
             os.makedirs(dir_path, exist_ok=True)
             
-        player_name = data["player"]["name"]
+        player_name = save_data["player"]["name"]
+        
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(encode_save_data(save_data))
+            f.flush()
+            os.fsync(f.fileno())
         
         for i in range(2, 0, -1):
-            old_backup = os.path.join(SAVE_DIR, f"{player_name}_backup{i}.json")
-            new_backup = os.path.join(SAVE_DIR, f"{player_name}_backup{i+1}.json")
+            old_backup = os.path.join(SAVE_DIR, f"{player_name}_backup{i}{SAVE_EXTENSION}")
+            new_backup = os.path.join(SAVE_DIR, f"{player_name}_backup{i+1}{SAVE_EXTENSION}")
             if os.path.exists(old_backup):
                 try:
-                    os.rename(old_backup, new_backup)
+                    os.replace(old_backup, new_backup)
                 except Exception as e:
                     if game_logger:
                         game_logger.error(f"备份重命名失败: {e}")
         
-        if os.path.exists(file_path):
-            try:
-                os.rename(file_path, os.path.join(SAVE_DIR, f"{player_name}_backup1.json"))
-            except Exception as e:
-                if game_logger:
-                    game_logger.error(f"主存档重命名失败: {e}")
+        # 备份按文件头识别格式，旧版JSON主存档可以直接轮换成备份
+        legacy_path = os.path.splitext(file_path)[0] + LEGACY_SAVE_EXTENSION
+        for main_path in (file_path, legacy_path):
+            if os.path.exists(main_path):
+                try:
+                    os.replace(main_path, os.path.join(SAVE_DIR, f"{player_name}_backup1{SAVE_EXTENSION}"))
+                except Exception as e:
+                    if game_logger:
+                        game_logger.error(f"主存档重命名失败: {e}")
+                break
+        
+        os.replace(temp_path, file_path)
+        fsync_directory(dir_path)
+        store.activate(region_generation, region_state)
         
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
+        # 备份轮换后，最旧备份引用的那一代区域数据可能已无存档引用
+        try:
+            collect_region_garbage(os.path.dirname(file_path), player_name)
+        except Exception as e:
+            if game_logger:
+                game_logger.warning(f"清理区域数据失败：{e}")
         
         if game_logger:
-            game_logger.info(f"存档成功：{file_path}")
+            game_logger.info(f"存档成功：{file_path}（写入 {len(chunk_edits)} 个有新修改的区块）")
         return True, "存档成功（含3个备份）"
     except Exception as e:
         if game_logger:
             game_logger.error(f"存档失败：{str(e)}")
         return False, f"存档失败：{str(e)}"
 
+def create_json_file(file_path, data, loaded_chunks, world_seed, chunk_tiers=None):
+    """同步存档：区块修改进区域文件，玩家与世界信息写成二进制存档（旧版JSON主存档作为备份1轮换）"""
+    snapshot = snapshot_save(file_path, data, loaded_chunks, world_seed, chunk_tiers)
+    success, msg = write_save_snapshot(file_path, snapshot)
+    if not success:
+        restore_save_snapshot(snapshot, loaded_chunks)
+    if chunk_tiers is not None:
+        chunk_tiers.end_save()
+    return success, msg
+
+class BackgroundSaver:
+    """后台存档 - 主线程只拍快照，编码与写盘在后台线程完成，游戏不等待磁盘
+    
+    同一时间只进行一次存档；主循环每帧调用poll取回结果，失败时快照中的区块重新标记为dirty。
+    写盘线程不是守护线程，退出游戏时会先把正在写的存档写完。
+    """
+    
+    def __init__(self):
+        self.thread = None
+        self.snapshot = None
+        self.result = None
+    
+    def busy(self):
+        return self.thread is not None
+    
+    def start(self, file_path, data, loaded_chunks, world_seed, chunk_tiers=None):
+        """拍快照并开始后台写盘，已有存档在进行时返回False"""
+        if self.busy():
+            return False
+        self.snapshot = snapshot_save(file_path, data, loaded_chunks, world_seed, chunk_tiers)
+        self.result = None
+        self.thread = threading.Thread(target=self._run, args=(file_path, self.snapshot), name="save-writer")
+        self.thread.start()
+        return True
+    
+    def _run(self, file_path, snapshot):
+        self.result = write_save_snapshot(file_path, snapshot)
+    
+    def poll(self, loaded_chunks):
+        """存档完成时返回(是否成功, 提示)，进行中或空闲时返回None"""
+        if self.thread is None or self.thread.is_alive():
+            return None
+        self.thread.join()
+        success, msg = self.result
+        if not success:
+            restore_save_snapshot(self.snapshot, loaded_chunks)
+        if self.snapshot["chunk_tiers"] is not None:
+            self.snapshot["chunk_tiers"].end_save()
+        self.thread = None
+        self.snapshot = None
+        return success, msg
+    
+    def wait(self, loaded_chunks):
+        """等待正在进行的存档结束（离开游戏时使用）"""
+        if self.thread is not None:
+            self.thread.join()
+        return self.poll(loaded_chunks)
+
 def load_json_file(file_path):
+    global WORLD_REGION_STORE
     try:
         if not os.path.exists(file_path):
-            player_name = os.path.basename(file_path).replace(".json", "")
-            for i in range(1, 4):
-                backup_path = os.path.join(SAVE_DIR, f"{player_name}_backup{i}.json")
+            player_name = os.path.splitext(os.path.basename(file_path))[0]
+            backup_paths = [os.path.join(SAVE_DIR, f"{player_name}_backup{i}{extension}")
+                            for i in range(1, 4) for extension in (SAVE_EXTENSION, LEGACY_SAVE_EXTENSION)]
+            for backup_path in backup_paths:
                 if os.path.exists(backup_path):
                     file_path = backup_path
                     if game_logger:
@@ -1297,29 +3830,55 @@ def load_json_file(file_path):
             else:
                 return False, "主存档与备份均不存在", None, None, None
         
-        with open(file_path, "r", encoding="utf-8") as f:
-            save_data = json.load(f)
+        save_data = read_save_data(file_path)
         
         if "world_seed" not in save_data or save_data["world_seed"] is None:
             save_data["world_seed"] = random.randint(0, 2**32 - 1)
             if game_logger:
                 game_logger.info(f"补全随机种子：{save_data['world_seed']}")
         world_seed = save_data["world_seed"]
+        # 旧存档没有记录噪声后端，都是经典柏林噪声生成的；区块重建前必须先切换后端
+        noise_backend = save_data.get("noise_backend", "perlin")
+        if noise_backend not in NOISE_BACKENDS:
+            return False, f"未知的噪声后端：{noise_backend}", None, None, None
+        set_world_noise_backend(noise_backend)
+        
+        # 区块修改保存在区域文件中，进入游戏后按存档记录的那一代索引按需读取
+        save_dir = os.path.dirname(file_path)
+        player_name = save_data["player"]["name"]
+        store = RegionChunkStore(get_world_region_path(save_dir, player_name, world_seed, noise_backend))
+        if save_data.get("chunk_store") == "region":
+            try:
+                store.compact(REGION_COMPACT_RATIO)
+                store.open_generation(save_data["region_generation"])
+            except (OSError, ValueError, KeyError) as e:
+                return False, f"区域数据缺失或损坏：{e}", None, None, None
+        WORLD_REGION_STORE = store
         
-        loaded_chunks = OrderedDict()
-        for chunk_key_str, non_default_blocks in save_data["loaded_chunks"].items():
+        loaded_chunks = World()
+        # 旧版存档（及转换工具生成的二进制存档）的修改直接写在存档里：全部加载并保持dirty，下次存档时迁移到区域文件
+        for chunk_key_str, non_default_blocks in save_data.get("loaded_chunks", {}).items():
             try:
                 chunk_x, chunk_z = map(int, chunk_key_str.split(","))
-                chunk = Chunk(chunk_x, chunk_z, world_seed)
+                chunk = create_chunk(chunk_x, chunk_z, world_seed)
                 for (x, y, z_range, block_id) in non_default_blocks:
                     if 0 <= x < CHUNK_SIZE and 0 <= y < Y_MAX and 0 <= z_range < CHUNK_SIZE:
-                        chunk.blocks[x][y][z_range] = block_id
+                        chunk.set_block(x, y, z_range, block_id)
                 loaded_chunks[(chunk_x, chunk_z)] = chunk
             except Exception as e:
                 if game_logger:
                     game_logger.error(f"加载区块失败 {chunk_key_str}: {e}")
                 continue
         
+        # 玩家所在区块及其周围同步加载，其余由区块驻留策略按需加载
+        position = save_data["player"]["position"]
+        center_x = int(position["world_x"] // CHUNK_SIZE)
+        center_z = int(position["world_z"] // CHUNK_SIZE)
+        for chunk_x in range(center_x - 1, center_x + 2):
+            for chunk_z in range(center_z - 1, center_z + 2):
+                if (chunk_x, chunk_z) not in loaded_chunks:
+                    loaded_chunks[(chunk_x, chunk_z)] = load_world_chunk(chunk_x, chunk_z, world_seed)
+        
         player_data = save_data["player"]
         if game_logger:
             game_logger.info(f"加载存档成功：{file_path}")
@@ -1335,8 +3894,10 @@ def load_save_list():
         return saves
     try:
         for file in os.listdir(SAVE_DIR):
-            if file.endswith(".json") and not file.startswith("_backup") and not file.endswith("_backup.json"):
-                saves.append(file.replace(".json", ""))
+            name, extension = os.path.splitext(file)
+            if extension in (SAVE_EXTENSION, LEGACY_SAVE_EXTENSION) and not name.startswith("_backup") and not name.endswith("_backup"):
+                if name not in saves:
+                    saves.append(name)
     except Exception as e:
         if game_logger:
             game_logger.error(f"读取存档列表失败: {e}")
@@ -1450,15 +4011,23 @@ def show_settings_menu(screen, scroll_offset=0):
     screen.blit(log_text, (log_btn.x + 20, log_btn.y + btn_height//2 - 10))
     settings_items.append(("log", log_btn))
     
+    # 自动存档间隔
+    autosave_btn = pygame.Rect(SCREEN_WIDTH//2 - btn_width//2, btn_y_start + 7*(btn_height + btn_margin) - scroll_offset, btn_width, btn_height)
+    pygame.draw.rect(screen, GREEN if SETTINGS["autosave_minutes"] else RED, autosave_btn)
+    autosave_label = f"每{SETTINGS['autosave_minutes']}分钟" if SETTINGS["autosave_minutes"] else "关"
+    autosave_text = small_font.render(f"自动存档: {autosave_label}", True, BLACK)
+    screen.blit(autosave_text, (autosave_btn.x + 20, autosave_btn.y + btn_height//2 - 10))
+    settings_items.append(("autosave", autosave_btn))
+    
     # 返回按钮
-    back_btn = pygame.Rect(SCREEN_WIDTH//2 - btn_width//2, btn_y_start + 7*(btn_height + btn_margin) - scroll_offset, btn_width, btn_height)
+    back_btn = pygame.Rect(SCREEN_WIDTH//2 - btn_width//2, btn_y_start + 8*(btn_height + btn_margin) - scroll_offset, btn_width, btn_height)
     pygame.draw.rect(screen, GRAY, back_btn)
     back_text = small_font.render("返回主菜单", True, BLACK)
     screen.blit(back_text, (back_btn.x + btn_width//2 - 40, back_btn.y + btn_height//2 - 10))
     settings_items.append(("back", back_btn))
     
     # 显示滚动提示
-    if btn_y_start + 8*(btn_height + btn_margin) - scroll_offset > SCREEN_HEIGHT:
+    if btn_y_start + 9*(btn_height + btn_margin) - scroll_offset > SCREEN_HEIGHT:
         tip_text = small_font.render("使用鼠标滚轮上下滚动", True, (150, 150, 150))
         screen.blit(tip_text, (SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT - 30))
     
@@ -1522,6 +4091,7 @@ def show_controls_info(screen):
         "I - 打开/关闭物品栏",
         "ESC - 返回主菜单",
         "F2 - 显示/隐藏FPS",
+        "F3 - 查找最近的选中方块",
         "F5 - 快速保存",
         "",
         "触摸控制:",
@@ -1681,52 +4251,29 @@ def show_tip(screen, tip_text, duration=1500):
 
 def find_safe_spawn_location():
     """找到安全的出生点位置"""
+    temp_gen = get_terrain_generator(WORLD_SEED)
     for attempt in range(100):
         spawn_x = random.randint(-20, 20)
         spawn_z = 0
         
-        temp_gen = TerrainGenerator(WORLD_SEED)
-        surface_height = int(temp_gen.get_height(spawn_x))
+        surface_height = int(temp_gen.get_column_profile(spawn_x)[0])
         
         chunk_x = int(spawn_x // CHUNK_SIZE)
         chunk_z = int(spawn_z // CHUNK_SIZE)
         
         if (chunk_x, chunk_z) not in LOADED_CHUNKS:
-            LOADED_CHUNKS[(chunk_x, chunk_z)] = Chunk(chunk_x, chunk_z, WORLD_SEED)
+            LOADED_CHUNKS[(chunk_x, chunk_z)] = create_chunk(chunk_x, chunk_z, WORLD_SEED)
             
         chunk = LOADED_CHUNKS[(chunk_x, chunk_z)]
         in_x = int(spawn_x % CHUNK_SIZE)
         in_z = int(spawn_z % CHUNK_SIZE)
         
-        safe = True
-        for y_offset in range(3):
-            y_pos = surface_height + 2 + y_offset
-            if y_pos < Y_MAX:
-                if chunk.blocks[in_x][y_pos][in_z] != 0:
-                    safe = False
-                    break
-        
-        if safe and surface_height + 1 < Y_MAX:
-            if chunk.blocks[in_x][surface_height + 1][in_z] == 0:
-                safe = False
-        
-        if safe:
+        # 地表上一格是该列最高的方块：脚下实心，上方全是空气
+        if chunk.surface_y(in_x, in_z) == surface_height + 1:
             return spawn_x, surface_height + 2
     
     return 0, Y_MAX // 2
 
-def load_chunks_around_player(player):
-    """加载玩家周围的区块"""
-    player_chunk_x = int(player.world_x // CHUNK_SIZE)
-    player_chunk_z = int(player.world_z // CHUNK_SIZE)
-    
-    for dx in range(-RENDER_DISTANCE, RENDER_DISTANCE + 1):
-        for dz in range(-RENDER_DISTANCE, RENDER_DISTANCE + 1):
-            target_chunk_x = player_chunk_x + dx
-            target_chunk_z = player_chunk_z + dz
-            if (target_chunk_x, target_chunk_z) not in LOADED_CHUNKS:
-                LOADED_CHUNKS[(target_chunk_x, target_chunk_z)] = Chunk(target_chunk_x, target_chunk_z, WORLD_SEED)
-
 def show_player_name_input(screen):
     screen.fill(BLACK)
     title_text = main_font.render("wzmc新游戏 - 输入玩家名称", True, WHITE)
@@ -1826,14 +4373,22 @@ def show_settings_screen(screen):
                                 SETTINGS["log_enabled"] = not SETTINGS["log_enabled"]
                                 save_settings()
                                 load_settings()
+                            elif setting_type == "autosave":
+                                current = SETTINGS["autosave_minutes"]
+                                choice = AUTOSAVE_CHOICES.index(current) if current in AUTOSAVE_CHOICES else -1
+                                SETTINGS["autosave_minutes"] = AUTOSAVE_CHOICES[(choice + 1) % len(AUTOSAVE_CHOICES)]
+                                save_settings()
+                                load_settings()
                             elif setting_type == "back":
                                 return
 
 # ---------------------- 游戏主循环 ----------------------
 def return_to_main_menu(screen):
-    global LOADED_CHUNKS, WORLD_SEED, DROPS, MONSTERS
-    LOADED_CHUNKS = OrderedDict()
+    global LOADED_CHUNKS, WORLD_SEED, DROPS, MONSTERS, WORLD_REGION_STORE
+    LOADED_CHUNKS = World()
+    WORLD_REGION_STORE = None
     WORLD_SEED = random.randint(0, 2**32 - 1)
+    set_world_noise_backend(SETTINGS["noise_backend"])
     DROPS = []
     MONSTERS = []
     scroll_offset = 0
@@ -1864,7 +4419,6 @@ def return_to_main_menu(screen):
                         game_logger.info("进入沙盒模式")
                     spawn_x, spawn_z = find_safe_spawn_location()
                     player = Player(x=spawn_x, y=spawn_z, name="Sandbox_Player")
-                    load_chunks_around_player(player)
                     game_mode = "sandbox"
                     game_started = True
                     start_game_loop(screen, player, game_mode, fullscreen)
@@ -1888,7 +4442,6 @@ def return_to_main_menu(screen):
                                     final_name = user_input if user_input else default_name
                                     spawn_x, spawn_z = find_safe_spawn_location()
                                     player = Player(x=spawn_x, y=spawn_z, name=final_name)
-                                    load_chunks_around_player(player)
                                     save_data = {
                                         "player": player.to_save_data(),
                                         "game_state": {"current_map": "平原", "time": "白天" if is_day else "黑夜", "completed_quests": []}
@@ -1937,7 +4490,7 @@ def return_to_main_menu(screen):
                                             confirm = ""
                                         if confirm == "D":
                                             try:
-                                                os.remove(get_save_path(selected_save))
+                                                delete_save(selected_save)
                                                 show_tip(screen, f"删除成功：{selected_save}")
                                                 saves = load_save_list()
                                                 max_scroll = max(0, (len(saves) - visible_btn_count) * (btn_spacing + 10))
@@ -1948,7 +4501,7 @@ def return_to_main_menu(screen):
                                             show_tip(screen, "取消删除")
                                         selected_save = None
                     if selected_save not in ("back", None):
-                        success, msg, player_data, loaded_chunks, world_seed = load_json_file(get_save_path(selected_save))
+                        success, msg, player_data, loaded_chunks, world_seed = load_json_file(find_save_file(selected_save))
                         if success:
                             LOADED_CHUNKS = loaded_chunks
                             WORLD_SEED = world_seed
@@ -2016,6 +4569,19 @@ def start_game_loop(screen, player, game_mode, fullscreen):
     
     frame_counter = 0
     
+    # 周围区块交给后台线程生成，主循环只负责装入
+    chunk_service = ChunkGenerationService(WORLD_SEED)
+    chunk_tiers = ChunkTierManager(WORLD_SEED)
+    chunk_residency = ChunkResidencyPolicy(WORLD_SEED, tiers=chunk_tiers)
+    # 方块修改按帧批量通知俯视图缓存，只重画改动的列
+    chunk_renderer = ChunkRenderCache()
+    LOADED_CHUNKS.events.subscribe(chunk_renderer.apply_changes)
+    # 存档在后台线程写盘；存档结果在画面上提示几秒
+    saver = BackgroundSaver()
+    save_message = None
+    save_message_until = 0
+    next_autosave = time.time() + SETTINGS["autosave_minutes"] * 60
+    
     if USE_DOUBLE_BUFFER:
         buffer_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
 
@@ -2029,6 +4595,11 @@ def start_game_loop(screen, player, game_mode, fullscreen):
                 sys.exit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
+                    chunk_service.shutdown()
+                    saver.wait(LOADED_CHUNKS)
+                    if game_logger:
+                        game_logger.info(f"区块分级驻留统计：{chunk_tiers.stats()}")
+                    chunk_tiers.clear_cold()
                     return_to_main_menu(screen)
                 elif event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4):
                     tool_id = int(event.unicode) - 1
@@ -2040,11 +4611,18 @@ def start_game_loop(screen, player, game_mode, fullscreen):
                     player.bag_open = not player.bag_open
                 elif event.key == pygame.K_F5:
                     save_data = {"player": player.to_save_data(), "game_state": {"current_map": "平原", "time": "白天" if is_day else "黑夜", "completed_quests": []}}
-                    success, msg = create_json_file(get_save_path(player.name), save_data, LOADED_CHUNKS, WORLD_SEED)
-                    show_tip(screen, msg)
+                    if not saver.start(get_save_path(player.name), save_data, LOADED_CHUNKS, WORLD_SEED, chunk_tiers):
+                        save_message, save_message_until = "上一次存档尚未完成", time.time() + 2
                 elif event.key == pygame.K_F2:
                     global show_fps
                     show_fps = not show_fps
+                elif event.key == pygame.K_F3:
+                    block_name = BLOCK_TYPES[selected_block]["name"]
+                    nearest = find_nearest_block(LOADED_CHUNKS, selected_block, player.world_x,
+                                                 min(Y_MAX - 1, max(0, player.world_z)), player.world_z)
+                    mined = sum(chunk.mined_count(selected_block) for chunk in LOADED_CHUNKS.values())
+                    where = f"最近 {nearest}" if nearest else "附近没有"
+                    show_tip(screen, f"{block_name}：已加载 {count_blocks(LOADED_CHUNKS, selected_block)} 个，已挖 {mined} 个，{where}")
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if handle_virtual_controls(event, player):
                     continue
@@ -2052,33 +4630,30 @@ def start_game_loop(screen, player, game_mode, fullscreen):
                 if event.button == 1:
                     mouse_pos = pygame.mouse.get_pos()
                     target_block = get_mouse_block(mouse_pos, player)
-                    block_x, block_y, block_z = target_block
-                    chunk_x, chunk_z = int(block_x//CHUNK_SIZE), int(block_z//CHUNK_SIZE)
-                    if (chunk_x, chunk_z) in LOADED_CHUNKS:
-                        chunk = LOADED_CHUNKS[(chunk_x, chunk_z)]
-                        in_x, in_z = int(block_x % CHUNK_SIZE), int(block_z % CHUNK_SIZE)
-                        if 0 <= in_x < CHUNK_SIZE and 0 <= block_y < Y_MAX and 0 <= in_z < CHUNK_SIZE:
-                            block_id = chunk.blocks[in_x][block_y][in_z]
-                            if block_id != 0 and BLOCK_TYPES[block_id]["breakable"]:
-                                current_dig_block = target_block
-                                current_dig_progress = 0
+                    block_id = LOADED_CHUNKS.get_block(*target_block)
+                    if block_id != 0 and BLOCK_TYPES[block_id]["breakable"]:
+                        current_dig_block = target_block
+                        current_dig_progress = 0
                 elif event.button == 3:
                     if player.inventory.get(selected_block, 0) > 0:
                         mouse_pos = pygame.mouse.get_pos()
                         target_block = get_mouse_block(mouse_pos, player)
                         block_x, block_y, block_z = target_block
-                        chunk_x, chunk_z = int(block_x//CHUNK_SIZE), int(block_z//CHUNK_SIZE)
-                        if (chunk_x, chunk_z) in LOADED_CHUNKS:
-                            chunk = LOADED_CHUNKS[(chunk_x, chunk_z)]
-                            in_x, in_z = int(block_x % CHUNK_SIZE), int(block_z % CHUNK_SIZE)
-                            if 0 <= in_x < CHUNK_SIZE and 0 <= block_y < Y_MAX and 0 <= in_z < CHUNK_SIZE:
-                                if chunk.blocks[in_x][block_y][in_z] == 0:
-                                    chunk.blocks[in_x][block_y][in_z] = selected_block
-                                    player.inventory[selected_block] -= 1
-                                    play_sound("place")
+                        if (block_x // CHUNK_SIZE, block_z // CHUNK_SIZE) in LOADED_CHUNKS and LOADED_CHUNKS.get_block(block_x, block_y, block_z) == 0:
+                            if LOADED_CHUNKS.set_block(block_x, block_y, block_z, selected_block):
+                                player.inventory[selected_block] -= 1
+                                play_sound("place")
             elif event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP):
                 handle_virtual_controls(event, player)
 
+        save_result = saver.poll(LOADED_CHUNKS)
+        if save_result is not None:
+            save_message, save_message_until = save_result[1], time.time() + 3
+        if game_mode == "wzmc" and SETTINGS["autosave_minutes"] and time.time() >= next_autosave:
+            next_autosave = time.time() + SETTINGS["autosave_minutes"] * 60
+            save_data = {"player": player.to_save_data(), "game_state": {"current_map": "平原", "time": "白天" if is_day else "黑夜", "completed_quests": []}}
+            saver.start(get_save_path(player.name), save_data, LOADED_CHUNKS, WORLD_SEED, chunk_tiers)
+
         current_time = (current_time + 1) % DAY_DURATION
         if current_time == 0:
             is_day = not is_day
@@ -2090,17 +4665,8 @@ def start_game_loop(screen, player, game_mode, fullscreen):
                 spawn_z = player.world_z + random.randint(-10, 10)
                 MONSTERS.append(Monster(spawn_x, spawn_z))
 
-        load_chunks_around_player(player)
-        
-        if frame_counter % FRAME_SKIP == 0:
-            player_chunk_x = int(player.world_x // CHUNK_SIZE)
-            player_chunk_z = int(player.world_z // CHUNK_SIZE)
-            chunks_to_unload = []
-            for (chunk_x, chunk_z) in LOADED_CHUNKS:
-                if math.hypot(chunk_x - player_chunk_x, chunk_z - player_chunk_z) > RENDER_DISTANCE + 2:
-                    chunks_to_unload.append((chunk_x, chunk_z))
-            for chunk_key in chunks_to_unload:
-                del LOADED_CHUNKS[chunk_key]
+        chunk_residency.update(player, LOADED_CHUNKS, chunk_service, get_player_movement_vector())
+        chunk_service.install_ready(LOADED_CHUNKS)
 
         player.update(LOADED_CHUNKS)
         
@@ -2122,47 +4688,41 @@ def start_game_loop(screen, player, game_mode, fullscreen):
 
         if current_dig_block:
             block_x, block_y, block_z = current_dig_block
-            chunk_x, chunk_z = int(block_x//CHUNK_SIZE), int(block_z//CHUNK_SIZE)
-            if (chunk_x, chunk_z) in LOADED_CHUNKS:
-                chunk = LOADED_CHUNKS[(chunk_x, chunk_z)]
-                in_x, in_z = int(block_x % CHUNK_SIZE), int(block_z % CHUNK_SIZE)
-                if 0 <= in_x < CHUNK_SIZE and 0 <= block_y < Y_MAX and 0 <= in_z < CHUNK_SIZE:
-                    block_id = chunk.blocks[in_x][block_y][in_z]
-                    if block_id != 0:
-                        tool = TOOL_TYPES[player.current_tool]
-                        if block_id in tool["breakable_blocks"]:
-                            hardness = BLOCK_TYPES[block_id]["hardness"]
-                            efficiency = tool["efficiency"]
-                            current_dig_progress += efficiency / hardness * delta_time * 60
-                            if current_dig_progress >= 100:
-                                drop_id = BLOCK_TYPES[block_id]["drop"]
-                                if drop_id != 0:
-                                    DROPS.append(DropItem(block_x, block_z, drop_id))
-                                chunk.blocks[in_x][block_y][in_z] = 0
-                                current_dig_block = None
-                                current_dig_progress = 0
-                                play_sound("dig")
-                                
-                                if tool["durability"] > 0:
-                                    used_durability = getattr(player, "used_durability", 0) + 1
-                                    player.used_durability = used_durability
-                                    if used_durability >= tool["durability"]:
-                                        player.tools[player.current_tool] -= 1
-                                        if player.tools[player.current_tool] <= 0:
-                                            player.current_tool = 0
-                                        player.used_durability = 0
-                                        show_tip(screen, "工具损坏，已切换为徒手")
-                        else:
-                            current_dig_block = None
-                    else:
+            block_id = LOADED_CHUNKS.get_block(block_x, block_y, block_z)
+            if block_id != 0:
+                tool = TOOL_TYPES[player.current_tool]
+                if block_id in tool["breakable_blocks"]:
+                    hardness = BLOCK_TYPES[block_id]["hardness"]
+                    efficiency = tool["efficiency"]
+                    current_dig_progress += efficiency / hardness * delta_time * 60
+                    if current_dig_progress >= 100:
+                        drop_id = BLOCK_TYPES[block_id]["drop"]
+                        if drop_id != 0:
+                            DROPS.append(DropItem(block_x, block_z, drop_id))
+                        LOADED_CHUNKS.set_block(block_x, block_y, block_z, 0)
                         current_dig_block = None
+                        current_dig_progress = 0
+                        play_sound("dig")
+                                
+                        if tool["durability"] > 0:
+                            used_durability = getattr(player, "used_durability", 0) + 1
+                            player.used_durability = used_durability
+                            if used_durability >= tool["durability"]:
+                                player.tools[player.current_tool] -= 1
+                                if player.tools[player.current_tool] <= 0:
+                                    player.current_tool = 0
+                                player.used_durability = 0
+                                show_tip(screen, "工具损坏，已切换为徒手")
+                else:
+                    current_dig_block = None
             else:
                 current_dig_block = None
 
         target_surface = buffer_surface if USE_DOUBLE_BUFFER else screen
         target_surface.fill((255,255,255) if is_day else (10, 10, 30))
         
-        draw_infinite_map(target_surface, LOADED_CHUNKS, player)
+        LOADED_CHUNKS.events.flush()
+        draw_infinite_map(target_surface, LOADED_CHUNKS, player, chunk_renderer, chunk_service.pending_keys())
         
         if frame_counter % max(1, FRAME_SKIP // 2) == 0:
             for drop in DROPS:
@@ -2177,6 +4737,13 @@ def start_game_loop(screen, player, game_mode, fullscreen):
         selected_surf = small_font.render(f"选中方块：{BLOCK_TYPES[selected_block]['name']}", True, WHITE)
         target_surface.blit(selected_surf, (10, 30))
         
+        if saver.busy():
+            save_surf = small_font.render("存档中…", True, YELLOW)
+            target_surface.blit(save_surf, (10, 50))
+        elif save_message and time.time() < save_message_until:
+            save_surf = small_font.render(save_message, True, WHITE)
+            target_surface.blit(save_surf, (10, 50))
+        
         hp_bar_x = SCREEN_WIDTH - 110
         hp_bar_y = 10
         pygame.draw.rect(target_surface, BLACK, (hp_bar_x, hp_bar_y, 100, 8))
@@ -2193,12 +4760,691 @@ def start_game_loop(screen, player, game_mode, fullscreen):
             
         pygame.display.flip()
 
+# ---------------------- 命令行工具 ----------------------
+GOLDEN_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "terrain_golden.json")
+BENCHMARK_SEEDS = (1, 42, 20240601, 2**32 - 1)
+BENCHMARK_CHUNK_XS = range(-3, 4)
+BENCHMARK_CHUNK_ZS = (-1, 0, 1, 2, 3, 5, 6, 7)
+BENCHMARK_STAGES = (("height", "高度"), ("biome", "生物群系"), ("cave", "洞穴"), ("ore", "矿石"), ("decoration", "装饰（含方块数组组装）"))
+
+class TimedTerrainGenerator(TerrainGenerator):
+    """带分阶段计时的地形生成器（仅用于基准测试，输出与TerrainGenerator一致）"""
+    
+    def __init__(self, seed, stats):
+        super().__init__(seed)
+        self.stats = stats
+    
+    def _add(self, stage, start):
+        self.stats[stage] = self.stats.get(stage, 0.0) + time.perf_counter() - start
+    
+    def compute_column_profiles(self, xs):
+        start = time.perf_counter()
+        biome_before = self.stats.get("biome", 0.0)
+        profiles = super().compute_column_profiles(xs)
+        # 列计算中除生物群系外的部分都计入高度
+        self._add("height", start)
+        self.stats["height"] -= self.stats.get("biome", 0.0) - biome_before
+        return profiles
+    
+    def biome_values(self, xs):
+        start = time.perf_counter()
+        values = super().biome_values(xs)
+        self._add("biome", start)
+        return values
+    
+    def deep_cave_values(self, xs, ys):
+        start = time.perf_counter()
+        values = super().deep_cave_values(xs, ys)
+        self._add("cave", start)
+        return values
+    
+    def is_cave(self, x, y, deep_cave=None):
+        start = time.perf_counter()
+        result = super().is_cave(x, y, deep_cave)
+        self._add("cave", start)
+        return result
+    
+    def get_ore_at(self, x, y):
+        start = time.perf_counter()
+        result = super().get_ore_at(x, y)
+        self._add("ore", start)
+        return result
+    
+    def generate_chunk(self, chunk_x, chunk_y):
+        start = time.perf_counter()
+        chunk_data = super().generate_chunk(chunk_x, chunk_y)
+        self._add("terrain", start)
+        return chunk_data
+
+def terrain_content_hash(chunk_data):
+    """地形生成结果（CHUNK_SIZE×CHUNK_SIZE）的内容哈希"""
+    return hashlib.sha1(bytes(block for row in chunk_data for block in row)).hexdigest()
+
+def chunk_content_hash(chunk):
+    """区块全部方块（按x、y、z顺序）的内容哈希"""
+    return hashlib.sha1(chunk.dense_blocks()).hexdigest()
+
+def benchmark_chunk_cases():
+    """基准测试与黄金哈希使用的固定(种子, 区块)集合"""
+    return [(seed, chunk_x, chunk_z) for seed in BENCHMARK_SEEDS
+            for chunk_x in BENCHMARK_CHUNK_XS for chunk_z in BENCHMARK_CHUNK_ZS]
+
+def run_terrain_benchmark(repeat=1):
+    """生成固定区块集合，返回(生成总耗时, 区块数, 分阶段耗时, 各区块哈希, 各区块存储字节数之和)"""
+    stats = {}
+    hashes = {}
+    storage_bytes = 0
+    cases = benchmark_chunk_cases()
+    total = 0.0
+    for _ in range(repeat):
+        COLUMN_CACHE.clear()
+        DECORATION_PLAN_CACHE.clear()
+        generators = {seed: TimedTerrainGenerator(seed, stats) for seed in BENCHMARK_SEEDS}
+        for seed, chunk_x, chunk_z in cases:
+            terrain_before = stats.get("terrain", 0.0)
+            start = time.perf_counter()
+            chunk = Chunk(chunk_x, chunk_z, seed, terrain_gen=generators[seed])
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            # 区块构建中地形生成以外的时间计入装饰阶段
+            stats["decoration"] = stats.get("decoration", 0.0) + elapsed - (stats.get("terrain", 0.0) - terrain_before)
+            
+            # 哈希计算不计入耗时
+            storage_bytes += chunk.storage_bytes()
+            hashes[f"{seed}:{chunk_x},{chunk_z}"] = {
+                "terrain": terrain_content_hash(get_terrain_generator(seed).generate_chunk(chunk_x, chunk_z)),
+                "blocks": chunk_content_hash(chunk),
+            }
+    return total, len(cases) * repeat, stats, hashes, storage_bytes
+
+def load_golden_corpus(path=GOLDEN_CORPUS_PATH):
+    """读取黄金哈希语料，不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_golden_corpus(hashes, path=GOLDEN_CORPUS_PATH):
+    """写入黄金哈希语料"""
+    corpus = {
+        "format": 1,
+        "description": "TerrainGenerator.generate_chunk 与 Chunk 方块内容的SHA-1，键为\"种子:区块x,区块z\"",
+        "chunks": hashes,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+def command_benchmark(args):
+    """地形生成基准测试：输出区块/秒与分阶段耗时，并与黄金哈希对比"""
+    total, chunk_count, stats, hashes, storage_bytes = run_terrain_benchmark(args.repeat)
+    print(f"生成 {chunk_count} 个区块，耗时 {total:.3f} 秒，{chunk_count / total:.1f} 区块/秒")
+    for stage, name in BENCHMARK_STAGES:
+        print(f"  {name}: {stats.get(stage, 0.0) * 1000:.1f} ms")
+    print(f"区块存储：平均 {storage_bytes / chunk_count:.1f} 字节/区块（未分段为 {CHUNK_SIZE * Y_MAX} 字节）")
+    
+    if args.update_golden:
+        save_golden_corpus(hashes, args.golden)
+        print(f"已更新黄金哈希：{args.golden}（{len(hashes)} 个区块）")
+        return 0
+    
+    corpus = load_golden_corpus(args.golden)
+    if corpus is None:
+        print(f"黄金哈希不存在：{args.golden}，请使用 --update-golden 生成")
+        return 1
+    expected = corpus["chunks"]
+    mismatches = [key for key in sorted(hashes) if expected.get(key) != hashes[key]]
+    missing = [key for key in sorted(expected) if key not in hashes]
+    if not mismatches and not missing:
+        print(f"黄金哈希全部一致（{len(hashes)} 个区块）")
+        return 0
+    for key in mismatches[:20]:
+        parts = [part for part in ("terrain", "blocks") if expected.get(key, {}).get(part) != hashes[key][part]]
+        print(f"  不一致：{key}（{'、'.join(parts)}）")
+    print(f"黄金哈希不一致：{len(mismatches)} 个区块，缺失 {len(missing)} 个")
+    return 1
+
+def measure_noise_backend(name, samples):
+    """测量噪声后端的单点耗时（纳秒/样本），返回{接口: 耗时}"""
+    noise = NOISE_BACKENDS[name](12345)
+    xs = [i * 0.731 - samples * 0.3 for i in range(samples)]
+    ys = [i * 0.377 % 97.0 for i in range(samples)]
+    results = {}
+    
+    start = time.perf_counter()
+    for x, y in zip(xs, ys):
+        noise.noise2d(x, y, 0.05)
+    results["noise2d"] = (time.perf_counter() - start) / samples * 1e9
+    
+    start = time.perf_counter()
+    for x, y in zip(xs, ys):
+        noise.octave_noise2d(x, y, octaves=4, persistence=0.5, frequency=0.05)
+    results["octave_noise2d(4)"] = (time.perf_counter() - start) / samples * 1e9
+    
+    if np is not None:
+        x_arr = np.array(xs)
+        y_arr = np.array(ys)
+        start = time.perf_counter()
+        noise.octave_noise2d_array(x_arr, y_arr, octaves=4, persistence=0.5, frequency=0.05)
+        results["octave_noise2d_array(4)"] = (time.perf_counter() - start) / samples * 1e9
+    return results
+
+def measure_backend_chunk_rate(name, repeat=1):
+    """用指定噪声后端生成基准区块集合，返回区块/秒"""
+    cases = benchmark_chunk_cases()
+    total = 0.0
+    for _ in range(repeat):
+        COLUMN_CACHE.clear()
+        DECORATION_PLAN_CACHE.clear()
+        generators = {seed: TerrainGenerator(seed, name) for seed in BENCHMARK_SEEDS}
+        start = time.perf_counter()
+        for seed, chunk_x, chunk_z in cases:
+            Chunk(chunk_x, chunk_z, seed, terrain_gen=generators[seed])
+        total += time.perf_counter() - start
+    return len(cases) * repeat / total
+
+def command_benchmark_noise(args):
+    """比较各噪声后端的单点耗时与区块生成速度"""
+    for name in sorted(NOISE_BACKENDS):
+        results = measure_noise_backend(name, args.samples)
+        chunk_rate = measure_backend_chunk_rate(name, args.repeat)
+        timings = "，".join(f"{label} {value:.0f} ns/样本" for label, value in results.items())
+        print(f"{name}: {timings}，{chunk_rate:.1f} 区块/秒")
+    return 0
+
+def pregenerate_chunk_task(task):
+    """进程池任务：生成一个区块并返回其z=0平面数据"""
+    seed, chunk_x, chunk_z = task
+    return chunk_x, chunk_z, Chunk(chunk_x, chunk_z, seed).terrain_plane()
+
+def command_pregenerate(args):
+    """无界面预生成：多进程生成矩形范围内的区块并写入预生成存储"""
+    import multiprocessing
+    set_world_noise_backend(args.noise)
+    store = PregeneratedChunkStore(args.store, args.seed)
+    if not store.prepare(force=args.force):
+        print(f"存储 {store.path} 由其他地形参数生成，使用 --force 清空后重新生成")
+        return 1
+    
+    x0, x1 = sorted((args.x0, args.x1))
+    z0, z1 = sorted((args.z0, args.z1))
+    total = (x1 - x0 + 1) * (z1 - z0 + 1)
+    existing = store.existing_chunks()
+    # 由出生点向外生成，中断时已完成的总是离出生点最近的区块
+    tasks = sorted(((args.seed, chunk_x, chunk_z) for chunk_x in range(x0, x1 + 1) for chunk_z in range(z0, z1 + 1)
+                    if (chunk_x, chunk_z) not in existing),
+                   key=lambda task: task[1] * task[1] + task[2] * task[2])
+    done = total - len(tasks)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"种子 {args.seed}：共 {total} 个区块，已存在 {done} 个，待生成 {len(tasks)} 个，使用 {workers} 个进程")
+    if not tasks:
+        return 0
+    
+    generated = 0
+    start = time.time()
+    last_report = 0.0
+    pool = multiprocessing.Pool(workers, initializer=set_world_noise_backend, initargs=(args.noise,))
+    try:
+        for chunk_x, chunk_z, plane in pool.imap_unordered(pregenerate_chunk_task, tasks, chunksize=8):
+            store.write_chunk(chunk_x, chunk_z, plane)
+            done += 1
+            generated += 1
+            now = time.time()
+            if now - last_report >= args.progress_interval or done == total:
+                rate = generated / max(now - start, 1e-6)
+                print(f"进度 {done}/{total} ({done * 100 / total:.1f}%)，{rate:.1f} 区块/秒，"
+                      f"预计剩余 {(total - done) / rate:.0f} 秒", flush=True)
+                last_report = now
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print(f"已中断（完成 {done}/{total}），重新运行同一命令即可继续")
+        return 130
+    finally:
+        pool.join()
+    print(f"预生成完成：{store.path}")
+    return 0
+
+# ---------------------- 世界地图导出 ----------------------
+MAP_BIOME_COLORS = {"desert": SAND_COLOR, "forest": DARK_GREEN, "plains": GREEN, "hills": BROWN}
+MAP_UNKNOWN_COLOR = (255, 0, 255)
+
+class PNGStreamWriter:
+    """逐行写入的PNG编码器（8位RGB），内存占用只与单行像素有关"""
+    
+    def __init__(self, path, width, height):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        self.compressor = zlib.compressobj(6)
+    
+    def _write_chunk(self, tag, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(tag)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+    
+    def write_row(self, row):
+        """写入一行像素（width*3字节）"""
+        data = self.compressor.compress(b"\x00" + row)
+        if data:
+            self._write_chunk(b"IDAT", data)
+        self.rows_written += 1
+    
+    def close(self):
+        """写入剩余数据并关闭文件"""
+        self._write_chunk(b"IDAT", self.compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self.file.close()
+
+def read_save_edits(file_path):
+    """读取存档中的种子、噪声后端与各区块修改，返回(种子, 后端, {(区块x, 区块z): [(x, y, z, 方块ID), ...]})"""
+    save_data = read_save_data(file_path)
+    edits = {}
+    for chunk_key_str, blocks in save_data.get("loaded_chunks", {}).items():
+        chunk_x, chunk_z = map(int, chunk_key_str.split(","))
+        edits[(chunk_x, chunk_z)] = [tuple(block) for block in blocks]
+    if save_data.get("chunk_store") == "region":
+        save_dir = os.path.dirname(os.path.abspath(file_path))
+        world_seed, noise_backend = save_data.get("world_seed"), save_data.get("noise_backend", "perlin")
+        store = RegionChunkStore(get_world_region_path(save_dir, save_data["player"]["name"], world_seed, noise_backend))
+        store.open_generation(save_data["region_generation"])
+        for chunk_x, chunk_z in store.chunks():
+            data = store.read_chunk(chunk_x, chunk_z)
+            if data is not None:
+                edits[(chunk_x, chunk_z)] = decode_chunk_edits(data)
+    return save_data.get("world_seed"), save_data.get("noise_backend", "perlin"), edits
+
+def render_chunk_pixels(task):
+    """进程池任务：渲染一个区块的地形平面，返回自上（y大）而下的CHUNK_SIZE行RGB像素
+    
+    快速模式只用列高度和生物群系着色，不生成方块，也不应用存档修改。
+    """
+    seed, chunk_x, chunk_z, fast, edits = task
+    rows = [bytearray(CHUNK_SIZE * 3) for _ in range(CHUNK_SIZE)]
+    if fast:
+        profiles = get_terrain_generator(seed).get_column_profiles(chunk_x * CHUNK_SIZE, CHUNK_SIZE)
+        for x, (height, biome) in enumerate(profiles):
+            for local_y in range(CHUNK_SIZE):
+                world_y = chunk_z * CHUNK_SIZE + local_y
+                if world_y > height:
+                    color = BLOCK_TYPES[0]["color"]
+                elif world_y >= height - 4:
+                    color = MAP_BIOME_COLORS[biome]
+                else:
+                    color = STONE_GRAY
+                rows[CHUNK_SIZE - 1 - local_y][x * 3:x * 3 + 3] = bytes(color)
+    else:
+        chunk = create_chunk(chunk_x, chunk_z, seed)
+        # 地图展示的是地形平面（z=0、区块内前CHUNK_SIZE行），其余位置的修改不可见
+        for x, y, z, block_id in edits:
+            if z == 0 and 0 <= x < CHUNK_SIZE and 0 <= y < CHUNK_SIZE:
+                chunk.set_block(x, y, z, block_id)
+        for x in range(CHUNK_SIZE):
+            for local_y in range(CHUNK_SIZE):
+                block_type = BLOCK_TYPES.get(chunk.get_block(x, local_y, 0))
+                color = block_type["color"] if block_type else MAP_UNKNOWN_COLOR
+                rows[CHUNK_SIZE - 1 - local_y][x * 3:x * 3 + 3] = bytes(color)
+    return [bytes(row) for row in rows]
+
+def write_map_png(path, seed, x0, z0, x1, z1, fast, edits, chunk_row_renderer):
+    """按区块行自上而下渲染并流式写入一张PNG"""
+    writer = PNGStreamWriter(path, (x1 - x0 + 1) * CHUNK_SIZE, (z1 - z0 + 1) * CHUNK_SIZE)
+    try:
+        for chunk_z in range(z1, z0 - 1, -1):
+            tasks = [(seed, chunk_x, chunk_z, fast, edits.get((chunk_x, chunk_z), ())) for chunk_x in range(x0, x1 + 1)]
+            chunk_pixels = chunk_row_renderer(tasks)
+            for row in range(CHUNK_SIZE):
+                writer.write_row(b"".join(pixels[row] for pixels in chunk_pixels))
+    finally:
+        writer.close()
+
+def render_map_tile(task):
+    """进程池任务：渲染一张瓦片并写入PNG，返回文件路径"""
+    path, seed, x0, z0, x1, z1, fast, edits = task
+    write_map_png(path, seed, x0, z0, x1, z1, fast, edits, lambda tasks: [render_chunk_pixels(t) for t in tasks])
+    return path
+
+def command_export_map(args):
+    """导出世界地图：一张大PNG（按区块行并行渲染）或按瓦片并行渲染的多张PNG"""
+    import multiprocessing
+    seed = args.seed
+    noise_backend = args.noise
+    edits = {}
+    if args.save:
+        save_seed, save_backend, edits = read_save_edits(args.save)
+        if seed is None:
+            seed = save_seed
+        if noise_backend is None:
+            noise_backend = save_backend
+    if seed is None:
+        print("需要 --seed 或含种子的 --save")
+        return 1
+    noise_backend = noise_backend or "perlin"
+    set_world_noise_backend(noise_backend)
+    x0, x1 = sorted((args.x0, args.x1))
+    z0, z1 = sorted((args.z0, args.z1))
+    workers = args.workers or os.cpu_count() or 1
+    start = time.time()
+    
+    with multiprocessing.Pool(workers, initializer=set_world_noise_backend, initargs=(noise_backend,)) as pool:
+        if args.tiles:
+            os.makedirs(args.tiles, exist_ok=True)
+            size = args.tile_chunks
+            tasks = []
+            for tile_x in range(x0 // size, x1 // size + 1):
+                for tile_z in range(z0 // size, z1 // size + 1):
+                    tx0, tz0 = max(x0, tile_x * size), max(z0, tile_z * size)
+                    tx1, tz1 = min(x1, tile_x * size + size - 1), min(z1, tile_z * size + size - 1)
+                    tile_edits = {key: value for key, value in edits.items()
+                                  if tx0 <= key[0] <= tx1 and tz0 <= key[1] <= tz1}
+                    path = os.path.join(args.tiles, f"tile_{tile_x}_{tile_z}.png")
+                    tasks.append((path, seed, tx0, tz0, tx1, tz1, args.fast, tile_edits))
+            for index, path in enumerate(pool.imap_unordered(render_map_tile, tasks), 1):
+                print(f"瓦片 {index}/{len(tasks)}：{path}", flush=True)
+        else:
+            def render_row(tasks):
+                return pool.map(render_chunk_pixels, tasks)
+            write_map_png(args.output, seed, x0, z0, x1, z1, args.fast, edits, render_row)
+            print(f"地图已导出：{args.output}")
+    
+    chunk_count = (x1 - x0 + 1) * (z1 - z0 + 1)
+    print(f"共 {chunk_count} 个区块，耗时 {time.time() - start:.1f} 秒")
+    return 0
+
+# ---------------------- 种子扫描 ----------------------
+# 查询按代价从低到高求值：desert只用生物群系，cave用高度加洞穴噪声，ore需要生成完整区块
+SEED_QUERY_COST = {"desert": 0, "cave": 1, "ore": 2}
+
+def parse_seed_query(text):
+    """解析查询：desert:半径、cave:半径、ore:方块ID:x0,z0,x1,z1[:最低密度]"""
+    parts = text.split(":")
+    if parts[0] in ("desert", "cave") and len(parts) == 2:
+        return (parts[0], int(parts[1]))
+    if parts[0] == "ore" and len(parts) in (3, 4):
+        x0, z0, x1, z1 = map(int, parts[2].split(","))
+        min_density = float(parts[3]) if len(parts) == 4 else 0.0
+        return ("ore", int(parts[1]), min(x0, x1), min(z0, z1), max(x0, x1), max(z0, z1), min_density)
+    raise ValueError(f"无法解析的查询：{text}")
+
+def evaluate_seed_query(terrain_gen, query):
+    """对一个种子求值一条查询，返回(是否满足, 指标)；desert/cave指标为离x=0的距离，ore为密度"""
+    kind = query[0]
+    if kind in ("desert", "cave"):
+        radius = query[1]
+        profiles = terrain_gen.get_column_profiles(-radius, 2 * radius + 1)
+        distances = []
+        for world_x, (height, biome) in zip(range(-radius, radius + 1), profiles):
+            if kind == "desert":
+                matched = biome == "desert"
+            else:
+                # 地表那一格被洞穴挖空即为洞口
+                matched = terrain_gen.is_cave(world_x, int(height))
+            if matched:
+                distances.append(abs(world_x))
+        return bool(distances), min(distances, default=None)
+    
+    _, block_id, x0, z0, x1, z1, min_density = query
+    count = 0
+    total = 0
+    for chunk_x in range(x0, x1 + 1):
+        for chunk_y in range(z0, z1 + 1):
+            for row in terrain_gen.generate_decorated_chunk(chunk_x, chunk_y)[0]:
+                count += row.count(block_id)
+                total += len(row)
+    density = count / total
+    return count > 0 and density >= min_density, density
+
+def scan_seed_task(task):
+    """进程池任务：按代价顺序求值查询，遇到不满足的查询立即停止，返回(种子, 是否全部满足, 指标列表)"""
+    seed, queries = task
+    # 不进注册表，扫描大量种子时内存不会随种子数增长
+    terrain_gen = TerrainGenerator(seed, noise_backend=WORLD_NOISE_BACKEND)
+    metrics = [None] * len(queries)
+    for index in sorted(range(len(queries)), key=lambda i: SEED_QUERY_COST[queries[i][0]]):
+        matched, metrics[index] = evaluate_seed_query(terrain_gen, queries[index])
+        if not matched:
+            return seed, False, metrics
+    return seed, True, metrics
+
+def seed_rank_key(queries, metrics):
+    """按查询给出的顺序排序：距离越小越好，密度越大越好"""
+    return tuple(-metric if query[0] == "ore" else metric for query, metric in zip(queries, metrics))
+
+def command_scan_seeds(args):
+    """多进程批量扫描种子，把满足全部查询的种子按指标排序写入结果文件"""
+    import multiprocessing
+    try:
+        queries = [parse_seed_query(text) for text in args.query]
+    except ValueError as e:
+        print(e)
+        return 2
+    seeds = args.seeds if args.seeds else range(args.start, args.start + args.count)
+    tasks = [(seed, queries) for seed in seeds]
+    workers = args.workers or os.cpu_count() or 1
+    print(f"扫描 {len(tasks)} 个种子，{len(queries)} 条查询，使用 {workers} 个进程")
+    
+    matches = []
+    scanned = 0
+    start = time.time()
+    last_report = 0.0
+    with multiprocessing.Pool(workers, initializer=set_world_noise_backend, initargs=(args.noise,)) as pool:
+        for seed, matched, metrics in pool.imap_unordered(scan_seed_task, tasks, chunksize=4):
+            scanned += 1
+            if matched:
+                matches.append((seed, metrics))
+            now = time.time()
+            if now - last_report >= 1.0 or scanned == len(tasks):
+                print(f"进度 {scanned}/{len(tasks)}，命中 {len(matches)} 个", flush=True)
+                last_report = now
+    
+    matches.sort(key=lambda match: (seed_rank_key(queries, match[1]), match[0]))
+    results = [{"seed": seed, "metrics": dict(zip(args.query, metrics))} for seed, metrics in matches]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"queries": args.query, "scanned": scanned, "results": results}, f, ensure_ascii=False, indent=2)
+    for rank, result in enumerate(results[:args.top], 1):
+        print(f"{rank}. 种子 {result['seed']}：{result['metrics']}")
+    print(f"共命中 {len(results)} 个种子，耗时 {time.time() - start:.1f} 秒，结果已写入 {args.output}")
+    return 0
+
+def block_search_task(task):
+    """进程池任务：统计一个区块中某方块的数量、被挖掉的数量及离原点最近的位置"""
+    seed, chunk_x, chunk_z, edits, block_id, origin = task
+    chunk = create_chunk(chunk_x, chunk_z, seed)
+    for x, y, z, edit_block in edits:
+        if 0 <= x < CHUNK_SIZE and 0 <= y < Y_MAX and 0 <= z < CHUNK_SIZE:
+            chunk.set_block(x, y, z, edit_block)
+    nearest = find_nearest_block({(chunk_x, chunk_z): chunk}, block_id, *origin)
+    return chunk.count_block(block_id), chunk.mined_count(block_id), nearest
+
+def command_find_blocks(args):
+    """在种子或存档的区块矩形内统计并查找某种方块（叠加存档修改）"""
+    import multiprocessing
+    seed = args.seed
+    noise_backend = args.noise
+    edits = {}
+    if args.save:
+        save_seed, save_backend, edits = read_save_edits(args.save)
+        if seed is None:
+            seed = save_seed
+        if noise_backend is None:
+            noise_backend = save_backend
+    if seed is None:
+        print("需要 --seed 或含种子的 --save")
+        return 1
+    noise_backend = noise_backend or "perlin"
+    set_world_noise_backend(noise_backend)
+    try:
+        origin = tuple(float(value) for value in args.origin.split(","))
+    except ValueError:
+        origin = ()
+    if len(origin) != 3:
+        print(f"原点格式应为 x,y,z：{args.origin}")
+        return 2
+    x0, x1 = sorted((args.x0, args.x1))
+    z0, z1 = sorted((args.z0, args.z1))
+    tasks = [(seed, chunk_x, chunk_z, edits.get((chunk_x, chunk_z), ()), args.block, origin)
+             for chunk_x in range(x0, x1 + 1) for chunk_z in range(z0, z1 + 1)]
+    workers = args.workers or os.cpu_count() or 1
+    
+    total = 0
+    mined = 0
+    nearest = None
+    with multiprocessing.Pool(workers, initializer=set_world_noise_backend, initargs=(noise_backend,)) as pool:
+        for count, chunk_mined, position in pool.imap_unordered(block_search_task, tasks, chunksize=8):
+            total += count
+            mined += chunk_mined
+            if position is not None and (nearest is None or math.dist(position, origin) < math.dist(nearest, origin)):
+                nearest = position
+    block_name = BLOCK_TYPES.get(args.block, {"name": str(args.block)})["name"]
+    print(f"{block_name}：{len(tasks)} 个区块中共 {total} 个，已被挖掉 {mined} 个")
+    print(f"离 {origin} 最近：{nearest}" if nearest else "范围内没有该方块")
+    return 0
+
+def command_compact_save(args):
+    """清理存档及其备份都不再引用的区域数据，再压缩各世界的区域文件"""
+    save_data = read_save_data(args.save)
+    save_dir = os.path.dirname(os.path.abspath(args.save))
+    player_name = save_data["player"]["name"]
+    removed = collect_region_garbage(save_dir, player_name)
+    root = get_region_store_path(save_dir, player_name)
+    worlds = [os.path.join(root, name) for name in os.listdir(root)
+              if os.path.isdir(os.path.join(root, name))] if os.path.isdir(root) else []
+    reclaimed = sum(RegionChunkStore(path).compact() for path in worlds)
+    print(f"删除 {removed} 个不再引用的文件，压缩 {len(worlds)} 个世界的区域文件，回收 {reclaimed} 字节")
+    return 0
+
+def command_convert_saves(args):
+    """把存档目录里的旧版JSON存档（含备份）批量转换为二进制存档"""
+    if not os.path.isdir(args.dir):
+        print(f"存档目录不存在：{args.dir}")
+        return 1
+    converted = skipped = failed = 0
+    json_bytes = binary_bytes = 0
+    for file in sorted(os.listdir(args.dir)):
+        name, extension = os.path.splitext(file)
+        if extension != LEGACY_SAVE_EXTENSION:
+            continue
+        json_path = os.path.join(args.dir, file)
+        binary_path = os.path.join(args.dir, name + SAVE_EXTENSION)
+        if os.path.exists(binary_path) and not args.overwrite:
+            print(f"跳过 {file}：{name + SAVE_EXTENSION} 已存在")
+            skipped += 1
+            continue
+        try:
+            data = encode_save_data(read_save_data(json_path))
+            with open(binary_path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(binary_path + ".tmp", binary_path)
+        except Exception as e:
+            print(f"转换失败 {file}：{e}")
+            failed += 1
+            continue
+        json_bytes += os.path.getsize(json_path)
+        binary_bytes += len(data)
+        converted += 1
+        if not args.keep_json:
+            os.remove(json_path)
+    print(f"已转换 {converted} 个存档（{json_bytes} -> {binary_bytes} 字节），跳过 {skipped} 个，失败 {failed} 个")
+    return 1 if failed else 0
+
+def build_command_parser():
+    """构建无界面命令行工具的参数解析器"""
+    import argparse
+    parser = argparse.ArgumentParser(description="沙盒游戏命令行工具（无需显示设备）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    benchmark = subparsers.add_parser("benchmark", help="地形生成基准测试与黄金哈希校验")
+    benchmark.add_argument("--repeat", type=int, default=1)
+    benchmark.add_argument("--golden", default=GOLDEN_CORPUS_PATH, help="黄金哈希语料路径")
+    benchmark.add_argument("--update-golden", action="store_true", help="用本次结果重写黄金哈希")
+    benchmark.set_defaults(handler=command_benchmark)
+    
+    benchmark_noise = subparsers.add_parser("benchmark-noise", help="比较各噪声后端的速度")
+    benchmark_noise.add_argument("--samples", type=int, default=50000, help="单点计时的样本数")
+    benchmark_noise.add_argument("--repeat", type=int, default=1)
+    benchmark_noise.set_defaults(handler=command_benchmark_noise)
+    
+    pregenerate = subparsers.add_parser("pregenerate", help="多进程预生成出生点附近的区块")
+    pregenerate.add_argument("--seed", type=int, required=True)
+    pregenerate.add_argument("--x0", type=int, required=True, help="区块矩形的x起点（含）")
+    pregenerate.add_argument("--z0", type=int, required=True, help="区块矩形的z起点（含）")
+    pregenerate.add_argument("--x1", type=int, required=True, help="区块矩形的x终点（含）")
+    pregenerate.add_argument("--z1", type=int, required=True, help="区块矩形的z终点（含）")
+    pregenerate.add_argument("--store", default=PREGEN_DIR, help="预生成存储根目录")
+    pregenerate.add_argument("--workers", type=int, default=0, help="进程数，默认使用全部CPU核心")
+    pregenerate.add_argument("--progress-interval", type=float, default=1.0, help="进度输出间隔（秒）")
+    pregenerate.add_argument("--force", action="store_true", help="地形参数不一致时清空旧数据")
+    pregenerate.add_argument("--noise", choices=sorted(NOISE_BACKENDS), default="perlin", help="噪声后端")
+    pregenerate.set_defaults(handler=command_pregenerate)
+    
+    export_map = subparsers.add_parser("export-map", help="把世界地形导出为PNG图片或瓦片")
+    export_map.add_argument("--seed", type=int, default=None)
+    export_map.add_argument("--save", default=None, help="存档文件，用于读取种子并叠加玩家修改")
+    export_map.add_argument("--x0", type=int, required=True, help="区块矩形的x起点（含）")
+    export_map.add_argument("--z0", type=int, required=True, help="区块矩形的z起点（含）")
+    export_map.add_argument("--x1", type=int, required=True, help="区块矩形的x终点（含）")
+    export_map.add_argument("--z1", type=int, required=True, help="区块矩形的z终点（含）")
+    export_map.add_argument("--output", default="world_map.png", help="单张PNG的输出路径")
+    export_map.add_argument("--tiles", default=None, help="瓦片输出目录；指定后按瓦片导出")
+    export_map.add_argument("--tile-chunks", type=int, default=16, help="每张瓦片的边长（区块数）")
+    export_map.add_argument("--fast", action="store_true", help="只用地表高度和生物群系着色，跳过方块生成")
+    export_map.add_argument("--workers", type=int, default=0, help="进程数，默认使用全部CPU核心")
+    export_map.add_argument("--noise", choices=sorted(NOISE_BACKENDS), default=None, help="噪声后端，默认取存档记录或perlin")
+    export_map.set_defaults(handler=command_export_map)
+    
+    scan_seeds = subparsers.add_parser("scan-seeds", help="多进程批量扫描满足条件的种子")
+    scan_seeds.add_argument("--query", action="append", required=True,
+                            help="desert:半径 | cave:半径 | ore:方块ID:x0,z0,x1,z1[:最低密度]，可重复，排序按给出顺序")
+    scan_seeds.add_argument("--start", type=int, default=0, help="起始种子")
+    scan_seeds.add_argument("--count", type=int, default=1000, help="扫描的种子数量")
+    scan_seeds.add_argument("--seeds", type=int, nargs="+", default=None, help="直接指定种子列表")
+    scan_seeds.add_argument("--output", default="seed_scan.json", help="排序结果输出路径")
+    scan_seeds.add_argument("--top", type=int, default=10, help="在终端显示的前几名")
+    scan_seeds.add_argument("--workers", type=int, default=0, help="进程数，默认使用全部CPU核心")
+    scan_seeds.add_argument("--noise", choices=sorted(NOISE_BACKENDS), default="perlin", help="噪声后端")
+    scan_seeds.set_defaults(handler=command_scan_seeds)
+    
+    find_blocks = subparsers.add_parser("find-blocks", help="统计并查找区块矩形内的某种方块")
+    find_blocks.add_argument("--block", type=int, required=True, help="方块ID")
+    find_blocks.add_argument("--seed", type=int, default=None)
+    find_blocks.add_argument("--save", default=None, help="存档文件，用于读取种子并叠加玩家修改")
+    find_blocks.add_argument("--x0", type=int, required=True, help="区块矩形的x起点（含）")
+    find_blocks.add_argument("--z0", type=int, required=True, help="区块矩形的z起点（含）")
+    find_blocks.add_argument("--x1", type=int, required=True, help="区块矩形的x终点（含）")
+    find_blocks.add_argument("--z1", type=int, required=True, help="区块矩形的z终点（含）")
+    find_blocks.add_argument("--origin", default="0,0,0", help="查找最近位置的原点 x,y,z（世界坐标）")
+    find_blocks.add_argument("--workers", type=int, default=0, help="进程数，默认使用全部CPU核心")
+    find_blocks.add_argument("--noise", choices=sorted(NOISE_BACKENDS), default=None, help="噪声后端，默认取存档记录或perlin")
+    find_blocks.set_defaults(handler=command_find_blocks)
+    
+    compact_save = subparsers.add_parser("compact-save", help="清理不再被存档引用的区域数据并压缩区域文件")
+    compact_save.add_argument("--save", required=True, help="存档文件路径")
+    compact_save.set_defaults(handler=command_compact_save)
+    
+    convert_saves = subparsers.add_parser("convert-saves", help="把旧版JSON存档批量转换为二进制存档")
+    convert_saves.add_argument("--dir", default=SAVE_DIR, help="存档目录")
+    convert_saves.add_argument("--keep-json", action="store_true", help="转换后保留原JSON文件")
+    convert_saves.add_argument("--overwrite", action="store_true", help="覆盖已存在的二进制存档")
+    convert_saves.set_defaults(handler=command_convert_saves)
+    
+    return parser
+
+def run_command_line(argv):
+    """执行命令行工具，返回退出码"""
+    args = build_command_parser().parse_args(argv)
+    return args.handler(args)
+
 # ---------------------- 主函数 ----------------------
 def main():
-    global menu_bg, main_font, small_font, IS_MOBILE, show_fps, game_logger
+    global menu_bg, main_font, small_font, IS_MOBILE, show_fps, game_logger, GENERATED_CHUNK_CACHE
     
     # 初始化日志系统
     game_logger = GameLogger(LOG_DIR, enabled=True)
+    GENERATED_CHUNK_CACHE = GeneratedChunkCache(GENERATED_CACHE_DIR)
     
     # 模拟版本检查错误（如你提供的日志示例）
     game_logger.info("Hello from the pygame community. https://www.pygame.org/contribute.html")
@@ -2264,6 +5510,11 @@ def main():
     return_to_main_menu(screen)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    # 带参数启动时进入命令行工具，不初始化窗口
+    if len(sys.argv) > 1:
+        sys.exit(run_command_line(sys.argv[1:]))
     try:
         main()
     except Exception as e: